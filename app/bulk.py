@@ -0,0 +1,86 @@
+# app/bulk.py
+import csv, io, json
+
+import pandas as pd
+from sqlalchemy.types import JSON, LargeBinary
+
+from .settings import BULK_COPY, COPY_CHUNK_ROWS
+
+"""
+PostgreSQL bulk-load path for the loaders.
+Rows are streamed with COPY FROM STDIN (CSV) into a temporary staging table
+shaped like the target, then merged in one INSERT ... SELECT ... ON CONFLICT.
+That's a few round trips per batch instead of one bound statement per page of
+rows, which is what makes multi-million-row backfills practical.
+Callers check copy_supported() and keep their generic executemany path for
+SQLite, PostgreSQL drivers other than psycopg2 (COPY goes through its
+cursor's copy_expert), or when BULK_COPY=0.
+"""
+
+NULL = r"\N"   # COPY's NULL marker; empty strings stay empty strings
+
+def copy_supported(bind) -> bool:
+    return (BULK_COPY and bind.dialect.name == "postgresql"
+            and bind.dialect.driver == "psycopg2")
+
+# CSV chunks of df, with JSON columns serialized, binary columns in bytea hex
+# form and NaN/None as NULL
+def _csv_chunks(df: pd.DataFrame, json_cols, chunk_rows, binary_cols=()):
+    for i in range(0, len(df), chunk_rows):
+        part = df.iloc[i:i + chunk_rows]
+        if json_cols:
+            part = part.assign(**{
+                c: part[c].map(lambda v: json.dumps(v) if v is not None else None)
+                for c in json_cols
+            })
+        if binary_cols:
+            part = part.assign(**{
+                c: part[c].map(lambda v: "\\x" + bytes(v).hex() if v is not None else None)
+                for c in binary_cols
+            })
+        buf = io.StringIO()
+        part.to_csv(buf, header=False, index=False, na_rep=NULL, quoting=csv.QUOTE_MINIMAL)
+        buf.seek(0)
+        yield buf
+
+def copy_merge(s, table, df: pd.DataFrame, keys, update=None,
+               chunk_rows: int = COPY_CHUNK_ROWS) -> int:
+    """
+    COPY df's columns into a staging table, then INSERT them into `table`.
+    Conflicts on `keys` are skipped, or, if `update` lists columns, overwritten
+    with the incoming values (last row wins for repeated keys in the batch).
+    Runs on the session's connection/transaction; the caller commits.
+    Returns rows inserted (or inserted + updated).
+    """
+    if df.empty:
+        return 0
+    cols = list(df.columns)
+    col_list = ", ".join(f'"{c}"' for c in cols)
+    json_cols = [c for c in cols if isinstance(table.c[c].type, JSON)]
+    binary_cols = [c for c in cols if isinstance(table.c[c].type, LargeBinary)]
+    stage = f"_stage_{table.name}"
+
+    raw = s.connection().connection.driver_connection   # psycopg2 connection
+    with raw.cursor() as cur:
+        cur.execute(f'DROP TABLE IF EXISTS "{stage}"')
+        cur.execute(f'CREATE TEMP TABLE "{stage}" ON COMMIT DROP AS '
+                    f'SELECT {col_list} FROM "{table.name}" WITH NO DATA')
+        for buf in _csv_chunks(df, json_cols, chunk_rows, binary_cols):
+            cur.copy_expert(f'COPY "{stage}" ({col_list}) FROM STDIN '
+                            f"WITH (FORMAT csv, NULL '{NULL}')", buf)
+
+        key_list = ", ".join(f'"{c}"' for c in keys)
+        if update:
+            # DO UPDATE may not touch a row twice in one statement: keep the
+            # last staged row per key (ctid order = COPY order)
+            source = (f'SELECT DISTINCT ON ({key_list}) {col_list} FROM "{stage}" '
+                      f"ORDER BY {key_list}, ctid DESC")
+            action = "DO UPDATE SET " + ", ".join(f'"{c}" = EXCLUDED."{c}"' for c in update)
+        else:
+            source = f'SELECT {col_list} FROM "{stage}"'
+            action = "DO NOTHING"
+        cur.execute(f'INSERT INTO "{table.name}" ({col_list}) {source} '
+                    f"ON CONFLICT ({key_list}) {action}")
+        merged = cur.rowcount
+        cur.execute(f'DROP TABLE "{stage}"')
+    return merged
@@ -1,16 +1,62 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
-from .settings import DB_URL
+from .settings import (
+    DB_URL, DB_SQLITE_WAL, DB_SQLITE_SYNCHRONOUS, DB_SQLITE_CACHE_MB, DB_SQLITE_MMAP_MB,
+    DB_BUSY_TIMEOUT_SEC, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE_SEC, DB_POOL_PRE_PING,
+)
 
 """
 This class sets up the connection and session to the database.
 """
 
+# Per-connection SQLite settings: WAL lets readers (the dashboard) run while a
+# writer commits; NORMAL sync is durable in WAL mode except on power loss
+def _sqlite_pragmas(dbapi_conn, _record):
+    cur = dbapi_conn.cursor()
+    if DB_SQLITE_WAL:
+        cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute(f"PRAGMA synchronous={DB_SQLITE_SYNCHRONOUS}")
+    cur.execute(f"PRAGMA cache_size=-{DB_SQLITE_CACHE_MB * 1024}")   # negative = KiB
+    cur.execute(f"PRAGMA mmap_size={DB_SQLITE_MMAP_MB * 1024 * 1024}")
+    cur.execute(f"PRAGMA busy_timeout={int(DB_BUSY_TIMEOUT_SEC * 1000)}")
+    cur.execute("PRAGMA temp_store=MEMORY")
+    cur.close()
+
+# Engine with the storage profile from settings applied for the URL's dialect
+def make_engine(url=DB_URL, **kwargs):
+    backend = make_url(url).get_backend_name()
+    if backend == "sqlite":
+        kwargs.setdefault("connect_args", {"timeout": DB_BUSY_TIMEOUT_SEC})
+    elif backend == "postgresql":
+        kwargs.setdefault("pool_size", DB_POOL_SIZE)
+        kwargs.setdefault("max_overflow", DB_MAX_OVERFLOW)
+        kwargs.setdefault("pool_recycle", DB_POOL_RECYCLE_SEC)
+        kwargs.setdefault("pool_pre_ping", DB_POOL_PRE_PING)
+    eng = create_engine(url, future=True, **kwargs)
+    if backend == "sqlite":
+        event.listen(eng, "connect", _sqlite_pragmas)
+    return eng
+
 # Engine = connection object to the database.
-engine = create_engine(DB_URL, future=True, echo=False)
+engine = make_engine(DB_URL, echo=False)
 
 # Way of communication to the db (insert, query, update)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 
 # Parent class for all models
 Base = declarative_base()
+
+
+# INSERT construct for the engine's dialect, so loaders can use
+# ON CONFLICT DO NOTHING / DO UPDATE (supported on SQLite and PostgreSQL).
+# The dialect modules are imported here so a process only loads the one it uses.
+def dialect_insert(table, bind=None):
+    name = (bind or engine).dialect.name
+    if name == "postgresql":
+        from sqlalchemy.dialects import postgresql
+        return postgresql.insert(table)
+    if name == "sqlite":
+        from sqlalchemy.dialects import sqlite
+        return sqlite.insert(table)
+    raise NotImplementedError(f"Bulk upsert not supported on dialect '{name}'")
@@ -1,33 +1,34 @@
 # app/etl_news.py
-import time, requests
+import argparse
 import pandas as pd
-import nltk
-from nltk.sentiment import SentimentIntensityAnalyzer
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
-from .settings import MARKETAUX, STOCKS
-from .db import SessionLocal
+from .settings import MARKETAUX, STOCKS, LOAD_CHUNK_SIZE, MARKETAUX_URL
+from .db import SessionLocal, dialect_insert
+from .bulk import copy_supported, copy_merge
+from .fetcher import fetch_json, fetch_many
+from .sentiment import score_titles
+from .metrics import metrics
 from .models import News
+from .news_archive import archive
 
 """
 This is the ETL (Extract Transform and Load) pipline
 for news and loads into the news table
 VADER: it's a sentiment analysis tool that measures whether
 a piece of text is positive, negative, neutral, or a mix
+The full article JSON (the `raw` column of the fetched frame) goes to the
+compressed news_payloads archive, once per URL, not into the news table.
 """
 
-# Make sure VADER (Valence Aware Dictionary and sEntiment Reasoner) is available
-try:
-    nltk.data.find("sentiment/vader_lexicon.zip") # Lexicon = Dictionary
-except LookupError:
-    nltk.download("vader_lexicon", quiet=True)
+URL = MARKETAUX_URL
 
-sia = SentimentIntensityAnalyzer()
-
-URL = "https://api.marketaux.com/v1/news/all"
-
-def fetch_news(stock: str, limit=20) -> pd.DataFrame:
+@metrics.timed("fetch_news", rows=len)
+def fetch_news(stock: str, limit=20, replay: bool = False, use_cache: bool = None) -> pd.DataFrame:
     """
     Pull recent news for one stock (headline-level).
+    replay=True parses the last cached response instead of calling the API;
+    use_cache=False always calls it (see fetch_json).
     """
     params = {
         "symbols": stock,
@@ -36,8 +37,8 @@ def fetch_news(stock: str, limit=20) -> pd.DataFrame:
         "api_token": MARKETAUX,
         "limit": limit,
     }
-    r = get_with_backoff(URL, params=params)
-    payload = r.json()
+    payload = fetch_json(URL, params=params, provider="marketaux", replay=replay,
+                         use_cache=use_cache)
     items = payload.get("data", [])
     rows = []
     for a in items:
@@ -48,10 +49,13 @@ def fetch_news(stock: str, limit=20) -> pd.DataFrame:
             "title": title,
             "url": a.get("url"),
             "source": a.get("source"),
-            "sentiment": sia.polarity_scores(title)["compound"],
             "raw": a,
         })
-    return pd.DataFrame(rows)
+    df = pd.DataFrame(rows)
+    if not df.empty:
+        # Scored as one batch; repeated/syndicated headlines come from the cache
+        df.insert(5, "sentiment", score_titles(df["title"].tolist()))
+    return df
 
 def load_news(df: pd.DataFrame) -> int:
     """
@@ -62,7 +66,9 @@ def load_news(df: pd.DataFrame) -> int:
         return 0
     inserted = 0
     with SessionLocal() as s:
-        for _, row in df.iterrows():
+        archive(s, df)
+        s.commit()
+        for _, row in df.drop(columns="raw", errors="ignore").iterrows():
             try:
                 s.add(News(**row.to_dict()))
                 s.commit()
@@ -71,26 +77,70 @@ def load_news(df: pd.DataFrame) -> int:
                 s.rollback()  # duplicate, skip
     return inserted
 
-def run_all(stocks=None, per_stock_limit=20, pause_sec=2):
+@metrics.timed("load_news", rows=lambda n: n)
+def load_news_batch(df: pd.DataFrame, chunk_size: int = LOAD_CHUNK_SIZE) -> int:
+    """
+    Batch loader: fetches the existing (stock, published_at, title) keys for the
+    incoming time range once per stock, drops known rows in memory and inserts
+    the rest with a single multi-row statement. On PostgreSQL everything is
+    COPYed to a staging table and the unique key filters it in the merge.
+    Returns number of inserted rows.
+    """
+    if df.empty:
+        return 0
+    keys = ["stock", "published_at", "title"]
+    df = df.drop_duplicates(subset=keys)
+    fresh = []
+    with SessionLocal() as s:
+        if copy_supported(s.bind):
+            archive(s, df)
+            cols = [c for c in df.columns if c in News.__table__.c and c != "id"]
+            inserted = copy_merge(s, News.__table__, df[cols], keys=keys)
+            s.commit()
+            return inserted
+        for st, g in df.groupby("stock"):
+            known = set(s.execute(
+                select(News.stock, News.published_at, News.title).where(
+                    News.stock == st,
+                    News.published_at >= g["published_at"].min(),
+                    News.published_at <= g["published_at"].max(),
+                )
+            ).all())
+            is_new = [k not in known for k in g[keys].itertuples(index=False, name=None)]
+            fresh.append(g[is_new])
+        fresh = pd.concat(fresh)
+        archive(s, fresh)
+        cols = [c for c in fresh.columns if c in News.__table__.c and c != "id"]
+        rows = fresh[cols].to_dict("records")
+        inserted = 0
+        # ON CONFLICT only guards against a concurrent writer racing us
+        stmt = (
+            dialect_insert(News.__table__, s.bind)
+            .on_conflict_do_nothing(index_elements=keys)
+            .returning(News.id)
+        )
+        for i in range(0, len(rows), chunk_size):
+            inserted += len(s.execute(stmt, rows[i:i + chunk_size]).all())
+        s.commit()
+    return inserted
+
+def run_all(stocks=None, per_stock_limit=20, replay=False):
     stocks = stocks or STOCKS
     total = 0
-    for i, st in enumerate(stocks, start=1):
-        df = fetch_news(st, limit=per_stock_limit)
-        ins = load_news(df)
+    # Fetches run concurrently under the Marketaux rate limit;
+    # each finished ticker is loaded while the others are still in flight
+    fetch = lambda st: fetch_news(st, limit=per_stock_limit, replay=replay)
+    for st, df in fetch_many(fetch, stocks):
+        ins = load_news_batch(df)
         print(f"{st}: +{ins} news rows")
         total += ins
-        if i < len(stocks):
-            time.sleep(pause_sec)
     print(f"Done. Inserted {total} total news rows.")
 
-def get_with_backoff(url, params, retries=3, pause=20):
-    for i in range(retries):
-        r = requests.get(url, params=params, timeout=30)
-        if r.status_code == 200 and "Note" not in r.text:
-            return r
-        time.sleep(pause * (i+1))
-    raise RuntimeError("API unavailable or rate-limited")
-
 
 if __name__ == "__main__":
-    run_all()
+    parser = argparse.ArgumentParser(description="Load news headlines from Marketaux.")
+    parser.add_argument("--replay", action="store_true",
+                        help="run entirely from cached API responses (no network)")
+    args = parser.parse_args()
+    run_all(replay=args.replay)
+    metrics.write("etl_news")
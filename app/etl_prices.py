@@ -1,33 +1,50 @@
 # app/etl_prices.py
-import time, requests
-from datetime import datetime
+import argparse
+from datetime import date, datetime, timezone
+from functools import partial
+import numpy as np
 import pandas as pd
-from sqlalchemy import select
+from sqlalchemy import select, func
 from sqlalchemy.exc import IntegrityError
 
-from .settings import ALPHA, STOCKS
-from .db import SessionLocal
-from .models import Price
+from .settings import ALPHA, STOCKS, LOAD_CHUNK_SIZE, ALPHA_URL
+from .db import SessionLocal, engine, dialect_insert
+from .bulk import copy_supported, copy_merge
+from .fetcher import QuotaExceeded, fetch_json, fetch_many
+from .metrics import metrics
+from .models import Price, BackfillCheckpoint
 
 """
 This ETL (Extract - Transform - Load) file loads the daily
 stock prices into the prices table in the SQL database
 """
 
-AV_URL = "https://www.alphavantage.co/query"
-def fetch_prices_daily(stock: str) -> pd.DataFrame:
+AV_URL = ALPHA_URL
+
+@metrics.timed("fetch_prices_daily", rows=len)
+def fetch_prices_daily(stock: str, replay: bool = False, outputsize: str = "compact",
+                       use_cache: bool = None) -> pd.DataFrame:
     """
-    Pull compact daily time series (free endpoint) for one stock.
+    Pull the daily time series (free endpoint) for one stock: the last ~100
+    days with outputsize="compact", the whole history with "full".
+    replay=True parses the last cached response instead of calling the API;
+    use_cache=False always calls it (see fetch_json).
     """
     params = {
         "function": "TIME_SERIES_DAILY",   # <-- free endpoint
         "symbol": stock,
-        "outputsize": "compact",
+        "outputsize": outputsize,
         "apikey": ALPHA
     }
-    r = get_with_backoff(AV_URL, params=params)
-    j = r.json() # Converts response from json to python dict object
+    # Decoded JSON as a python dict
+    j = fetch_json(AV_URL, params=params, provider="alphavantage", replay=replay,
+                   use_cache=use_cache)
+    return _parse_daily(stock, j)
 
+# Turn an Alpha Vantage daily payload into stock, date, open, high, low, close, volume.
+# intraday=True (TIME_SERIES_INTRADAY payloads) keeps the bar time in a ts column instead.
+@metrics.timed("parse.prices", rows=len)
+def _parse_daily(stock: str, j: dict, intraday: bool = False) -> pd.DataFrame:
     # Handle common AV messages
     if "Error Message" in j:
         raise ValueError(f"Alpha Vantage error for {stock}: {j['Error Message']}")
@@ -42,32 +59,34 @@ def fetch_prices_daily(stock: str) -> pd.DataFrame:
     if key is None:
         raise ValueError(f"Unexpected response for {stock}: {j}")
 
-    df = pd.DataFrame(j[key]).T
-    df.index = pd.to_datetime(df.index)
+    series = j[key]   # {"YYYY-MM-DD": {"1. open": "..", ...}, ...}
 
     # Map columns for either DAILY or DAILY_ADJUSTED shape
-    cols = {c.lower(): c for c in df.columns}  # normalize
+    first = next(iter(series.values()), {})
+    cols = {c.lower(): c for c in first}  # normalize
     # Both endpoints have open/high/low/close; volume could be "5. volume" or "6. volume"
-    open_c  = cols.get("1. open",  None)
-    high_c  = cols.get("2. high",  None)
-    low_c   = cols.get("3. low",   None)
-    close_c = cols.get("4. close", None)
-    vol_c   = cols.get("5. volume", cols.get("6. volume", None))
-
-    if not all([open_c, high_c, low_c, close_c, vol_c]):
-        raise ValueError(f"Missing columns in AV payload for {stock}: {list(df.columns)}")
-
-    df = df.rename(columns={
-        open_c: "open",
-        high_c: "high",
-        low_c: "low",
-        close_c: "close",
-        vol_c: "volume",
-    })[["open", "high", "low", "close", "volume"]].astype(float)
+    fields = {
+        "open":   cols.get("1. open",  None),
+        "high":   cols.get("2. high",  None),
+        "low":    cols.get("3. low",   None),
+        "close":  cols.get("4. close", None),
+        "volume": cols.get("5. volume", cols.get("6. volume", None)),
+    }
+    if not all(fields.values()):
+        raise ValueError(f"Missing columns in AV payload for {stock}: {list(first)}")
 
+    # Columnar parse: one float array per field straight from the dict values,
+    # no transposed object frame (full-history payloads run to thousands of rows)
+    df = pd.DataFrame({
+        name: np.fromiter((float(r[src]) for r in series.values()), dtype=float, count=len(series))
+        for name, src in fields.items()
+    })
     df["stock"] = stock
-    df["date"] = df.index.date
-    return df.reset_index(drop=True)
+    if intraday:
+        df["ts"] = pd.to_datetime(list(series))
+    else:
+        df["date"] = np.array(list(series), dtype="datetime64[D]").astype(object)
+    return df
 
 def load_prices(df: pd.DataFrame) -> int:
     """
@@ -99,26 +118,135 @@ def load_prices(df: pd.DataFrame) -> int:
                 s.rollback()
     return inserted
 
-def run_all(stocks=None):
+@metrics.timed("load_prices", rows=lambda n: n)
+def load_prices_bulk(df: pd.DataFrame, chunk_size: int = LOAD_CHUNK_SIZE) -> int:
+    """
+    Set-based loader: INSERT ... ON CONFLICT DO NOTHING executed per chunk of
+    rows, relying on uix_price_stock_date to skip rows that already exist.
+    On PostgreSQL the rows go through COPY + a staging table instead.
+    Returns number of inserted rows.
+    """
+    if df.empty:
+        return 0
+    cols = ["stock", "date", "open", "high", "low", "close", "volume"]
+    inserted = 0
+    with SessionLocal() as s:
+        if copy_supported(s.bind):
+            inserted = copy_merge(s, Price.__table__, df[cols], keys=["stock", "date"])
+            s.commit()
+            return inserted
+        records = df[cols].to_dict("records")
+        # Passing the rows as parameters (not .values(rows)) keeps the compiled
+        # statement cached; SQLAlchemy sends it as multi-row VALUES pages.
+        # RETURNING yields only inserted rows, so conflicts aren't counted.
+        stmt = (
+            dialect_insert(Price.__table__, s.bind)
+            .on_conflict_do_nothing(index_elements=["stock", "date"])
+            .returning(Price.id)
+        )
+        for i in range(0, len(records), chunk_size):
+            inserted += len(s.execute(stmt, records[i:i + chunk_size]).all())
+        s.commit()
+    return inserted
+
+def run_all(stocks=None, replay=False):
     stocks = stocks or STOCKS
     total = 0
-    for i, s in enumerate(stocks, start=1):
-        df = fetch_prices_daily(s)
-        inserted = load_prices(df)
+    # Fetches run concurrently under the Alpha Vantage rate limit;
+    # each finished ticker is loaded while the others are still in flight
+    for s, df in fetch_many(partial(fetch_prices_daily, replay=replay), stocks):
+        inserted = load_prices_bulk(df)
         print(f"{s}: +{inserted} rows")
         total += inserted
-        # Be gentle with the free tier rate limit
-        if i < len(stocks):
-            time.sleep(12)
     print(f"Done. Inserted {total} total rows.")
 
-def get_with_backoff(url, params, retries=3, pause=20):
-    for i in range(retries):
-        r = requests.get(url, params=params, timeout=30)
-        if r.status_code == 200 and "Note" not in r.text:
-            return r
-        time.sleep(pause * (i+1))
-    raise RuntimeError("API unavailable or rate-limited")
+# --- Full-history backfill ------------------------------------------------------
+
+# Stocks that need no backfill from `since` (None = full history): a finished
+# checkpoint for the same or a wider range, or stored prices reaching back to `since`
+def _covered(s, stocks, since) -> set:
+    done = set()
+    for cp in s.scalars(select(BackfillCheckpoint).where(
+            BackfillCheckpoint.stock.in_(stocks), BackfillCheckpoint.status == "done")):
+        if cp.since is None or (since is not None and cp.since <= since):
+            done.add(cp.stock)
+    if since is not None:
+        done |= set(s.scalars(
+            select(Price.stock).where(Price.stock.in_(stocks))
+            .group_by(Price.stock).having(func.min(Price.date) <= since)
+        ))
+    return done
+
+def _checkpoint(stock, since, status, df=None, rows=0, error=None):
+    row = {
+        "stock": stock, "status": status, "since": since, "rows": rows, "error": error,
+        "first_date": df["date"].min() if df is not None and len(df) else None,
+        "last_date": df["date"].max() if df is not None and len(df) else None,
+        "updated_at": datetime.now(timezone.utc),
+    }
+    with SessionLocal() as s:
+        stmt = dialect_insert(BackfillCheckpoint.__table__, s.bind).values(**row)
+        s.execute(stmt.on_conflict_do_update(
+            index_elements=["stock"], set_={k: stmt.excluded[k] for k in row if k != "stock"}))
+        s.commit()
+
+def backfill(stocks=None, since: date = None, replay=False, restart=False):
+    """
+    Load full daily history (outputsize=full) for each stock, from `since` on.
+    Progress is checkpointed per stock in backfill_checkpoints, so a rerun
+    resumes with the stocks not yet done; restart=True ignores checkpoints.
+    A failed stock is recorded and retried on the next run. A spent daily
+    quota (the local limiter's count, or Alpha Vantage saying so) stops the
+    run without touching the stocks not yet fetched, so the rerun resumes there.
+    """
+    stocks = stocks or STOCKS
+    BackfillCheckpoint.__table__.create(bind=engine, checkfirst=True)
+    if not restart:
+        with SessionLocal() as s:
+            skip = _covered(s, stocks, since)
+        if skip:
+            print(f"Skipping {len(skip)} stocks already covered.")
+        stocks = [st for st in stocks if st not in skip]
+
+    def fetch(st):
+        try:
+            return fetch_prices_daily(st, replay=replay, outputsize="full"), None
+        except QuotaExceeded:
+            raise
+        except Exception as e:
+            return None, e
+
+    total = 0
+    try:
+        for st, (df, err) in fetch_many(fetch, stocks):
+            if err is not None:
+                _checkpoint(st, since, "failed", error=str(err))
+                print(f"{st}: failed ({err})")
+                continue
+            if since is not None:
+                df = df[df["date"] >= since]
+            inserted = load_prices_bulk(df)
+            _checkpoint(st, since, "done", df, inserted)
+            print(f"{st}: +{inserted} rows ({len(df)} days)")
+            total += inserted
+    except QuotaExceeded as e:
+        print(f"Stopped: {e}. Rerun to resume.")
+    print(f"Backfill inserted {total} total rows.")
+    return total
 
 if __name__ == "__main__":
-    run_all()
+    parser = argparse.ArgumentParser(description="Load daily prices from Alpha Vantage.")
+    parser.add_argument("--replay", action="store_true",
+                        help="run entirely from cached API responses (no network)")
+    parser.add_argument("--backfill", action="store_true",
+                        help="load full history (outputsize=full), resumable per stock")
+    parser.add_argument("--since", type=date.fromisoformat,
+                        help="with --backfill: only keep/require history from this date (YYYY-MM-DD)")
+    parser.add_argument("--restart", action="store_true",
+                        help="with --backfill: ignore checkpoints and refetch every stock")
+    args = parser.parse_args()
+    if args.backfill:
+        backfill(since=args.since, replay=args.replay, restart=args.restart)
+    else:
+        run_all(replay=args.replay)
+    metrics.write("etl_prices")
@@ -0,0 +1,196 @@
+# app/fetcher.py
+import random, threading, time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from .settings import (
+    ALPHA_RPM, ALPHA_RPD, MARKETAUX_RPM, MARKETAUX_RPD, FETCH_WORKERS, RESPONSE_CACHE,
+    RESPONSE_CACHE_READ,
+)
+from .response_cache import cache as response_cache
+from .metrics import metrics
+
+"""
+Shared fetch layer for the ETLs.
+One pooled HTTP session, a token-bucket rate limiter per API provider
+(requests/minute + requests/day), retries with jittered backoff that honour
+Retry-After, and a thread pool so many tickers are fetched concurrently
+while the caller loads finished ones into the DB.
+fetch_json() goes through the raw-response cache and supports offline replay.
+requests is imported with the first session, so cache hits and replays
+never load it.
+"""
+
+class QuotaExceeded(RuntimeError):
+    """The provider's daily request budget is used up."""
+
+class RateLimiter:
+    """
+    Token bucket refilled at per_minute/60 tokens per second (burst = bucket size),
+    plus a hard per-day cap that resets at UTC midnight.
+    """
+    def __init__(self, per_minute, per_day=None, burst=1):
+        self.rate = per_minute / 60.0
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.per_day = per_day
+        self.day = None
+        self.used_today = 0
+        self.spent_on = None      # day the provider itself said the quota was gone
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Block until a request may be sent. Returns seconds spent waiting."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self._count_today()
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def exhaust(self):
+        """The provider reported its daily budget spent: refuse requests until UTC midnight."""
+        with self.lock:
+            self.spent_on = datetime.now(timezone.utc).date()
+
+    def _count_today(self):
+        today = datetime.now(timezone.utc).date()
+        if today != self.day:
+            self.day, self.used_today = today, 0
+        if today == self.spent_on:
+            raise QuotaExceeded("Provider reported its daily limit reached")
+        if self.per_day is not None and self.used_today >= self.per_day:
+            raise QuotaExceeded(f"Daily limit of {self.per_day} requests reached")
+        self.used_today += 1
+
+# Alpha Vantage answers 200 with a "Note" body when throttled
+def _av_throttled(r) -> bool:
+    return "Note" in r.text
+
+# ... and with an "Information" body naming its rate limit once the daily
+# requests are used up (counted server-side, so it survives restarts)
+def _av_quota_spent(payload) -> bool:
+    info = str(payload.get("Information", "")).lower()
+    return "rate limit" in info or "requests per day" in info
+
+# error_keys: payloads carrying any of these are never written to the response cache
+# quota_spent: payload test for a spent daily budget (raises QuotaExceeded)
+PROVIDERS = {
+    "alphavantage": {"limiter": RateLimiter(ALPHA_RPM, ALPHA_RPD), "throttled": _av_throttled,
+                     "error_keys": ("Error Message", "Note", "Information"),
+                     "quota_spent": _av_quota_spent},
+    "marketaux":    {"limiter": RateLimiter(MARKETAUX_RPM, MARKETAUX_RPD), "throttled": None,
+                     "error_keys": ("error",), "quota_spent": None},
+}
+
+_session = None
+_session_lock = threading.Lock()
+
+# One keep-alive connection pool shared by every worker thread
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(FETCH_WORKERS, 1))
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+# Seconds to wait from a Retry-After header (delta-seconds or HTTP date), if any
+def _retry_after(r):
+    value = r.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+def get_with_backoff(url, params, provider, retries=3, pause=5):
+    """
+    Rate-limited GET with retries. Waits for the provider's token bucket before
+    every attempt; on failure sleeps Retry-After if given, otherwise an
+    exponential backoff with jitter. A throttle that outlasts every retry
+    means the daily budget is gone: QuotaExceeded.
+    """
+    conf = PROVIDERS[provider]
+    throttled = conf["throttled"]
+    for i in range(retries):
+        metrics.add(f"ratelimit.{provider}", sleep_s=conf["limiter"].acquire())
+        with metrics.stage(f"http.{provider}") as m:
+            r = get_session().get(url, params=params, timeout=30)
+            m.add(bytes=len(r.content))
+        if r.status_code == 200 and not (throttled and throttled(r)):
+            return r
+        delay = _retry_after(r)
+        if delay is None:
+            delay = pause * (2 ** i) * random.uniform(0.5, 1.5)
+        metrics.add(f"http.{provider}", retries=1, sleep_s=delay)
+        time.sleep(delay)
+    if r.status_code == 200:
+        conf["limiter"].exhaust()
+        raise QuotaExceeded(f"{provider} kept throttling after {retries} attempts")
+    raise RuntimeError("API unavailable or rate-limited")
+
+def fetch_json(url, params, provider, replay=False, use_cache=None):
+    """
+    Decoded JSON payload for a GET. Live payloads are recorded in the
+    raw-response cache (RESPONSE_CACHE); use_cache=True first serves today's
+    entry if it is still within the TTL (default: RESPONSE_CACHE_READ).
+    replay=True never touches the network: it serves the most recent cached
+    payload for the request and raises LookupError if there is none.
+    """
+    if replay:
+        with metrics.stage(f"cache_read.{provider}"):
+            payload = response_cache.latest(url, params)
+        if payload is None:
+            raise LookupError(f"No cached response to replay for {url} "
+                              f"(key {response_cache.key(url, params)[:12]})")
+        return payload
+    if use_cache is None:
+        use_cache = RESPONSE_CACHE_READ
+    if use_cache:
+        with metrics.stage(f"cache_read.{provider}"):
+            payload = response_cache.get(url, params)
+        if payload is not None:
+            return payload
+    r = get_with_backoff(url, params, provider)
+    with metrics.stage(f"json_decode.{provider}"):
+        payload = r.json()
+    quota_spent = PROVIDERS[provider]["quota_spent"]
+    if quota_spent and quota_spent(payload):
+        PROVIDERS[provider]["limiter"].exhaust()
+        raise QuotaExceeded(f"{provider}: {payload.get('Information')}")
+    if RESPONSE_CACHE and not any(k in payload for k in PROVIDERS[provider]["error_keys"]):
+        response_cache.put(url, params, payload)
+    return payload
+
+def fetch_many(fetch, stocks, workers=FETCH_WORKERS):
+    """
+    Run fetch(stock) for every stock on a thread pool and yield (stock, result)
+    as each completes, so the caller can load results while others are in flight.
+    The first exception cancels the pending fetches and is re-raised.
+    """
+    ex = ThreadPoolExecutor(max_workers=max(workers, 1))
+    try:
+        futures = {ex.submit(fetch, st): st for st in stocks}
+        for fut in as_completed(futures):
+            yield futures[fut], fut.result()
+    finally:
+        ex.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,372 @@
+# app/intraday.py
+import argparse, heapq, math, time
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, func
+
+from .settings import (
+    ALPHA, STOCKS, INTRADAY_INTERVAL, INTRADAY_VOL_BARS, INTRADAY_SENT_HOURS, INTRADAY_WEIGHTS,
+)
+from .db import SessionLocal
+from .etl_prices import AV_URL, _parse_daily
+from .fetcher import fetch_json, fetch_many
+from .metrics import metrics
+from .models import News
+
+"""
+Intraday mode: scores bars as they arrive instead of recomputing in batch.
+Each ticker keeps O(1)-update accumulators - a ring buffer of its last
+INTRADAY_VOL_BARS bar returns with a sliding Welford mean/variance, and its
+share of a time-ordered window of scored headlines - so a new bar costs a
+constant amount of per-ticker work plus one vectorized pass over the current
+cross-section for the z-scores and total_score (the daily engine's formula:
+vol median-filled, population z-scores, weighted sum).
+Bars come from TIME_SERIES_INTRADAY or a replay file; sentiment is seeded
+from the news table, and each poll adds the headlines loaded since (by
+news.id). The prices table is never read.
+
+    python -m app.intraday                          # fetch today's bars, score, print
+    python -m app.intraday --file bars.csv --out scores.csv
+    python -m app.intraday --poll 60                # keep polling the API
+"""
+
+BAR_TZ = "US/Eastern"     # Alpha Vantage intraday timestamps; news is converted to it
+RESYNC_EVERY = 10_000     # exact recompute of a ring buffer's sums after this many slides
+
+class RollingStats:
+    """Mean / sample std of the last `window` values, O(1) per add."""
+    def __init__(self, window: int):
+        self.window = window
+        self.buf = [0.0] * window
+        self.pos = self.n = self.slides = 0
+        self.mean = self.m2 = 0.0
+
+    def add(self, x: float):
+        w = self.window
+        if self.n < w:
+            self.n += 1
+            d = x - self.mean
+            self.mean += d / self.n
+            self.m2 += d * (x - self.mean)
+        else:
+            # Slide: drop the oldest value and add x in one step
+            old = self.buf[self.pos]
+            mean = self.mean + (x - old) / w
+            self.m2 += (x - old) * (x - mean + old - self.mean)
+            self.mean = mean
+            self.slides += 1
+        self.buf[self.pos] = x
+        self.pos = (self.pos + 1) % w
+        if self.slides >= RESYNC_EVERY:
+            # Bound floating-point drift of the running sums
+            self.slides = 0
+            self.mean = math.fsum(self.buf) / w
+            self.m2 = math.fsum((v - self.mean) ** 2 for v in self.buf)
+
+    def std(self) -> float:
+        """NaN until the window is full, like the daily rolling std."""
+        if self.n < self.window or self.window < 2:
+            return math.nan
+        return math.sqrt(max(self.m2, 0.0) / (self.window - 1))
+
+# Cross-sectional z-score, as risk_engine._zscore (population std, sd==0 -> 1)
+def _zscore(x: np.ndarray) -> np.ndarray:
+    if not np.isfinite(x).any():
+        return np.full(len(x), np.nan)
+    sd = np.nanstd(x)
+    return (x - np.nanmean(x)) / (sd if sd else 1.0)
+
+class IntradayScorer:
+    """
+    Per-ticker streaming state plus the latest cross-section.
+    update() feeds one bar and returns that ticker's scored row; every
+    active ticker's z-scores and total_score are refreshed on each bar.
+    """
+    def __init__(self, stocks=(), vol_bars=INTRADAY_VOL_BARS, sent_hours=INTRADAY_SENT_HOURS,
+                 weights=INTRADAY_WEIGHTS, on_score=None):
+        unknown = set(weights) - {"vol", "sent"}
+        if unknown:
+            raise ValueError(f"Intraday weights are for 'vol' and 'sent', got {sorted(unknown)}")
+        self.vol_bars = vol_bars
+        self.sent_window = sent_hours * 3600.0
+        self.weights = weights
+        self.on_score = on_score
+        self.stocks, self.index, self.stats = [], {}, []
+        # Per-ticker state in arrays (grown by doubling) so the cross-section
+        # is a handful of vectorized operations
+        self.last_ts = np.empty(0)
+        self.last_close = self.vol = self.sent_sum = self.sent_n = np.empty(0)
+        self.clock = -math.inf
+        self.pending, self.live = [], []    # news heaps: not yet in the window / in it
+        self.bars = 0
+        self.sent = self.vol_z = self.sent_z = self.total = np.empty(0)
+        for st in stocks:
+            self._slot(st)
+
+    def _slot(self, stock) -> int:
+        j = self.index.get(stock)
+        if j is None:
+            j = self.index[stock] = len(self.stocks)
+            self.stocks.append(stock)
+            self.stats.append(RollingStats(self.vol_bars))
+            if j == len(self.last_ts):
+                self._grow(max(16, 2 * j))
+        return j
+
+    def _grow(self, size):
+        def grown(a, fill):
+            return np.concatenate([a, np.full(size - len(a), fill)])
+        self.last_ts = grown(self.last_ts, -np.inf)
+        self.last_close = grown(self.last_close, np.nan)
+        self.vol = grown(self.vol, np.nan)
+        self.sent_sum = grown(self.sent_sum, 0.0)
+        self.sent_n = grown(self.sent_n, 0.0)
+
+    # --- news --------------------------------------------------------------------
+
+    def add_news(self, stock, ts: float, sentiment: float):
+        """Queue one scored headline (ts in epoch seconds); it counts once the clock reaches ts."""
+        if sentiment is None or math.isnan(sentiment) or ts <= self.clock - self.sent_window:
+            return
+        heapq.heappush(self.pending, (ts, self._slot(stock), sentiment))
+        if ts <= self.clock:
+            self._advance(self.clock)
+
+    # Move headlines into / out of the trailing window as the clock moves;
+    # each headline enters and leaves once, so this is amortized O(log n) per headline
+    def _advance(self, now: float):
+        self.clock = max(self.clock, now)
+        while self.pending and self.pending[0][0] <= self.clock:
+            ts, j, v = heapq.heappop(self.pending)
+            if ts > self.clock - self.sent_window:
+                heapq.heappush(self.live, (ts, j, v))
+                self.sent_sum[j] += v
+                self.sent_n[j] += 1
+        while self.live and self.live[0][0] <= self.clock - self.sent_window:
+            _, j, v = heapq.heappop(self.live)
+            self.sent_n[j] -= 1
+            self.sent_sum[j] = self.sent_sum[j] - v if self.sent_n[j] else 0.0
+
+    # --- bars --------------------------------------------------------------------
+
+    def update(self, stock, ts: float, close: float):
+        """
+        Feed one bar (ts in epoch seconds). Bars at or before the ticker's last
+        bar are ignored (returns None); otherwise returns the ticker's row.
+        """
+        j = self._slot(stock)
+        if ts <= self.last_ts[j]:
+            return None
+        prev = float(self.last_close[j])
+        if prev == prev and prev != 0:          # not NaN: first bar has no return
+            self.stats[j].add(close / prev - 1.0)
+            self.vol[j] = self.stats[j].std()
+        self.last_ts[j], self.last_close[j] = ts, close
+        self._advance(ts)
+        self.bars += 1
+        self._cross_section()
+        row = self.row(j)
+        if self.on_score is not None:
+            self.on_score(row)
+        return row
+
+    # z-scores across every ticker that has had a bar; days without news in
+    # the window count as neutral sentiment, as in the daily engine
+    def _cross_section(self):
+        seen = np.isfinite(self.last_ts)
+        sent = np.divide(self.sent_sum, self.sent_n, out=np.zeros(len(seen)), where=self.sent_n > 0)
+        self.sent = sent
+        vol_z = np.full(len(seen), np.nan)
+        sent_z = np.full(len(seen), np.nan)
+        v = self.vol[seen]
+        if np.isfinite(v).any():
+            v = np.where(np.isnan(v), np.nanmedian(v), v)
+        vol_z[seen] = _zscore(v)
+        sent_z[seen] = _zscore(sent[seen])
+        self.vol_z, self.sent_z = vol_z, sent_z
+        self.total = self.weights.get("vol", 0.0) * vol_z + self.weights.get("sent", 0.0) * sent_z
+
+    def row(self, j) -> dict:
+        return {
+            "stock": self.stocks[j], "ts": pd.Timestamp(self.last_ts[j], unit="s"),
+            "close": float(self.last_close[j]), "vol": float(self.vol[j]), "sent": float(self.sent[j]),
+            "vol_z": float(self.vol_z[j]), "sent_z": float(self.sent_z[j]),
+            "total_score": float(self.total[j]),
+        }
+
+    def frame(self) -> pd.DataFrame:
+        """Current cross-section: one row per ticker that has had a bar."""
+        rows = [self.row(j) for j in range(len(self.stocks)) if np.isfinite(self.last_ts[j])]
+        return pd.DataFrame(rows, columns=["stock", "ts", "close", "vol", "sent",
+                                           "vol_z", "sent_z", "total_score"])
+
+# --- sources -----------------------------------------------------------------------
+
+@metrics.timed("fetch_prices_intraday", rows=len)
+def fetch_intraday(stock: str, interval: str = INTRADAY_INTERVAL,
+                   replay: bool = False) -> pd.DataFrame:
+    """
+    Latest intraday bars for one stock (stock, ts, open, high, low, close, volume).
+    Live calls always go to the API, whatever RESPONSE_CACHE_READ says, so
+    every call sees the newest bars; the payload is still recorded for
+    replay=True, which reads it back instead.
+    """
+    params = {
+        "function": "TIME_SERIES_INTRADAY",
+        "symbol": stock,
+        "interval": interval,
+        "outputsize": "compact",
+        "apikey": ALPHA,
+    }
+    j = fetch_json(AV_URL, params=params, provider="alphavantage", replay=replay,
+                   use_cache=False)
+    return _parse_daily(stock, j, intraday=True)
+
+def read_bars(path) -> pd.DataFrame:
+    """
+    Bars from a replay file (.csv, or .json/.jsonl records) with stock, ts, close columns.
+    Timestamps with an offset are converted to BAR_TZ wall time; naive ones are taken as BAR_TZ.
+    """
+    path = Path(path)
+    if path.suffix in (".json", ".jsonl"):
+        df = pd.read_json(path, lines=path.suffix == ".jsonl")
+    else:
+        df = pd.read_csv(path)
+    missing = {"stock", "ts", "close"} - set(df.columns)
+    if missing:
+        raise ValueError(f"{path}: missing columns {sorted(missing)}")
+    return df.assign(ts=_bar_time(df["ts"]))
+
+# Naive BAR_TZ wall time, the clock the scorer and seed_news work in
+def _bar_time(ts: pd.Series) -> pd.Series:
+    try:
+        ts = pd.to_datetime(ts)
+    except ValueError:
+        ts = pd.to_datetime(ts, utc=True)     # mixed offsets, e.g. across a DST change
+    if ts.dt.tz is None:
+        return ts
+    return ts.dt.tz_convert(BAR_TZ).dt.tz_localize(None)
+
+# Bars from many tickers as one stream in time order (ties keep ticker order)
+def _merge_bars(frames) -> pd.DataFrame:
+    frames = [f[["stock", "ts", "close"]] for f in frames if len(f)]
+    if not frames:
+        return pd.DataFrame(columns=["stock", "ts", "close"])
+    return pd.concat(frames, ignore_index=True).sort_values(["ts", "stock"], kind="stable")
+
+def _epoch(ts: pd.Series) -> np.ndarray:
+    return ts.to_numpy(dtype="datetime64[ns]").astype(np.int64) / 1e9
+
+# Scored headlines (stock, published_at, sentiment rows) into the scorer, in BAR_TZ time
+def _feed_news(scorer: IntradayScorer, news: pd.DataFrame) -> int:
+    if news.empty:
+        return 0
+    ts = pd.to_datetime(news["published_at"], utc=True).dt.tz_convert(BAR_TZ).dt.tz_localize(None)
+    for st, t, v in zip(news["stock"], _epoch(ts), news["sentiment"]):
+        scorer.add_news(st, t, v)
+    return len(news)
+
+# Headlines from the news table for the sentiment window before `since`.
+# Returns (headlines fed, highest news id at that point) for poll_news to go on from
+def seed_news(scorer: IntradayScorer, stocks, since: pd.Timestamp) -> tuple:
+    start = (since - pd.Timedelta(seconds=scorer.sent_window)).tz_localize(BAR_TZ).tz_convert("UTC")
+    with SessionLocal() as s:
+        last_id = s.execute(select(func.max(News.id))).scalar() or 0
+        news = pd.read_sql(
+            select(News.stock, News.published_at, News.sentiment)
+            .where(News.stock.in_(list(stocks)), News.published_at >= start.isoformat(),
+                   News.id <= last_id),
+            s.connection(),
+        )
+    return _feed_news(scorer, news), last_id
+
+# Headlines loaded since the last seed/poll (news.id > after_id), e.g. by an
+# etl_news run alongside. Returns (headlines fed, new highest news id)
+def poll_news(scorer: IntradayScorer, stocks, after_id: int) -> tuple:
+    with SessionLocal() as s:
+        news = pd.read_sql(
+            select(News.id, News.stock, News.published_at, News.sentiment)
+            .where(News.stock.in_(list(stocks)), News.id > after_id),
+            s.connection(),
+        )
+    last_id = int(news["id"].max()) if len(news) else after_id
+    return _feed_news(scorer, news), last_id
+
+# --- driver ------------------------------------------------------------------------
+
+def replay(scorer: IntradayScorer, bars: pd.DataFrame, out=None) -> np.ndarray:
+    """
+    Feed bars in order. With `out`, the full cross-section is appended to that
+    CSV after each timestamp's bars. Returns per-bar update latencies (seconds).
+    """
+    ts = _epoch(bars["ts"])
+    lat = np.empty(len(bars))
+    header = out is not None and not Path(out).exists()
+    with metrics.stage("intraday.update") as m:
+        for i, (st, t, c) in enumerate(zip(bars["stock"].tolist(), ts.tolist(),
+                                           bars["close"].tolist())):
+            t0 = time.perf_counter()
+            scorer.update(st, t, c)
+            lat[i] = time.perf_counter() - t0
+            if out is not None and (i + 1 == len(ts) or ts[i + 1] != t):
+                scorer.frame().to_csv(out, mode="a", header=header, index=False)
+                header = False
+        m.add(rows=len(bars))
+    return lat
+
+def _report(scorer, lat, top):
+    if len(lat):
+        p50, p99 = np.percentile(lat, [50, 99]) * 1000
+        print(f"Scored {len(lat)} bars for {len(scorer.frame())} tickers "
+              f"(update p50 {p50:.3f} ms, p99 {p99:.3f} ms).")
+    print(scorer.frame().sort_values("total_score", ascending=False).head(top)
+          .to_string(index=False))
+
+def run(stocks=None, file=None, interval=INTRADAY_INTERVAL, replay_cache=False,
+        poll=None, out=None, news=True, top=10):
+    stocks = stocks or STOCKS
+    scorer = IntradayScorer(stocks)
+    fetch = partial(fetch_intraday, interval=interval, replay=replay_cache)
+    if file is not None:
+        bars = read_bars(file)
+    else:
+        bars = _merge_bars(df for _, df in fetch_many(fetch, stocks))
+    news_stocks = set(stocks) | set(bars["stock"])
+    news_id = 0
+    if news and len(bars):
+        seeded, news_id = seed_news(scorer, news_stocks, bars["ts"].min())
+        print(f"Seeded {seeded} headlines.")
+    _report(scorer, replay(scorer, bars, out), top)
+    while poll:
+        time.sleep(poll)
+        if news:
+            added, news_id = poll_news(scorer, news_stocks, news_id)
+            if added:
+                print(f"Added {added} new headlines.")
+        # Only bars newer than each ticker's last one are scored
+        bars = _merge_bars(df for _, df in fetch_many(fetch, stocks))
+        _report(scorer, replay(scorer, bars, out), top)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score intraday bars as they arrive.")
+    parser.add_argument("--file", help="replay bars from a CSV/JSON file instead of the API")
+    parser.add_argument("--interval", default=INTRADAY_INTERVAL,
+                        help="TIME_SERIES_INTRADAY interval (default: %(default)s)")
+    parser.add_argument("--replay", action="store_true",
+                        help="use cached API responses (no network)")
+    parser.add_argument("--poll", type=float,
+                        help="keep fetching new bars every POLL seconds")
+    parser.add_argument("--out", help="append each timestamp's cross-section to this CSV")
+    parser.add_argument("--no-news", dest="news", action="store_false",
+                        help="don't seed sentiment from the news table")
+    parser.add_argument("--top", type=int, default=10, help="rows to print (default: %(default)s)")
+    args = parser.parse_args()
+    try:
+        run(file=args.file, interval=args.interval, replay_cache=args.replay, poll=args.poll,
+            out=args.out, news=args.news, top=args.top)
+    except KeyboardInterrupt:
+        pass
+    metrics.write("intraday")
@@ -0,0 +1,164 @@
+# app/jobs.py
+import threading, time, traceback
+from datetime import datetime, timezone
+from functools import partial
+
+from sqlalchemy import select
+
+from .settings import STOCKS
+from .db import Base, SessionLocal, engine, dialect_insert
+from .fetcher import QuotaExceeded, fetch_many
+from .models import RefreshLog
+
+"""
+In-process background runner for the dashboard's "Refresh data" button.
+Runs prices ETL -> news ETL -> incremental risk scoring in one worker
+thread, reusing this process's imports, DB engine, HTTP session and rate
+limiters instead of spawning three interpreters. Progress is kept per
+ticker on the job object so any session can render it while the run goes on.
+Tickers already refreshed today (refresh_log) are skipped unless the job is
+forced, which also bypasses the response cache so every ticker is fetched
+from the API. Only one refresh can run per server process: later clicks
+attach to the running job.
+"""
+
+SOURCES = ("prices", "news")
+
+def _today():
+    return datetime.now(timezone.utc).date()
+
+def current_tickers(stocks, source, day=None) -> set:
+    """Stocks whose `source` was already fetched and loaded on `day` (default today)."""
+    with SessionLocal() as s:
+        return set(s.scalars(
+            select(RefreshLog.stock).where(
+                RefreshLog.source == source,
+                RefreshLog.refreshed_on >= (day or _today()),
+                RefreshLog.stock.in_(list(stocks)),
+            )
+        ))
+
+def mark_refreshed(stock, source, day=None):
+    with SessionLocal() as s:
+        stmt = dialect_insert(RefreshLog.__table__, s.bind).values(
+            stock=stock, source=source, refreshed_on=day or _today())
+        s.execute(stmt.on_conflict_do_update(
+            index_elements=["stock", "source"],
+            set_={"refreshed_on": stmt.excluded.refreshed_on},
+        ))
+        s.commit()
+
+class RefreshJob:
+    """State of one pipeline run; read by the UI while the worker updates it."""
+    def __init__(self, stocks, force=False):
+        self.stocks = list(stocks)
+        self.force = force
+        self.status = "running"   # running | done | failed
+        self.step = "starting"
+        self.started = time.time()
+        self.finished = None
+        self.error = None
+        self.inserted = {"prices": 0, "news": 0}
+        self.tickers = {st: {src: "queued" for src in SOURCES} for st in self.stocks}
+        self.lock = threading.Lock()
+
+    def set(self, stock, source, state):
+        with self.lock:
+            self.tickers[stock][source] = state
+
+    def snapshot(self) -> dict:
+        """Consistent copy for rendering."""
+        with self.lock:
+            return {
+                "status": self.status, "step": self.step, "error": self.error,
+                "started": self.started, "finished": self.finished,
+                "inserted": dict(self.inserted),
+                "tickers": {st: dict(v) for st, v in self.tickers.items()},
+            }
+
+    @property
+    def running(self) -> bool:
+        return self.status == "running"
+
+# Call fetch(stock) without letting one bad ticker cancel the others;
+# a spent daily quota still aborts the whole source
+def _guarded(fetch):
+    def run(stock):
+        try:
+            return fetch(stock), None
+        except QuotaExceeded:
+            raise
+        except Exception as e:
+            return None, e
+    return run
+
+def _run_source(job, source, fetch, load):
+    todo = job.stocks
+    if not job.force:
+        done = current_tickers(todo, source)
+        for st in done:
+            job.set(st, source, "skipped (current)")
+        todo = [st for st in todo if st not in done]
+    for st in todo:
+        job.set(st, source, "fetching")
+    job.step = f"{source} ({len(todo)} tickers)"
+    for st, (df, err) in fetch_many(_guarded(fetch), todo):
+        if err is not None:
+            job.set(st, source, f"error: {err}")
+            continue
+        job.set(st, source, "loading")
+        n = load(df)
+        mark_refreshed(st, source)
+        with job.lock:
+            job.inserted[source] += n
+        job.set(st, source, f"+{n} rows")
+
+def run_pipeline(job: RefreshJob):
+    # Imported here so the dashboard only pays for pandas/NLTK on first refresh
+    from .etl_prices import fetch_prices_daily, load_prices_bulk
+    from .etl_news import fetch_news, load_news_batch
+    from .risk_engine import write_risk_scores
+
+    try:
+        Base.metadata.create_all(bind=engine)
+        if job.force:
+            # Re-fetch means a new API call, not today's cached payload
+            fetch_prices_daily = partial(fetch_prices_daily, use_cache=False)
+            fetch_news = partial(fetch_news, use_cache=False)
+        _run_source(job, "prices", fetch_prices_daily, load_prices_bulk)
+        _run_source(job, "news", fetch_news, load_news_batch)
+        job.step = "risk scores"
+        write_risk_scores()
+        status = "done"
+    except Exception as e:
+        job.error = f"{type(e).__name__}: {e}"
+        traceback.print_exc()
+        status = "failed"
+    with job.lock:
+        job.step = status
+        job.finished = time.time()
+        job.status = status
+
+class JobRunner:
+    """Owns at most one running RefreshJob per process."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.job = None
+
+    def start(self, stocks=None, force=False):
+        """
+        Start a refresh in a daemon thread unless one is already running.
+        Returns (job, started) - started is False when attached to a running job.
+        """
+        with self.lock:
+            if self.job is not None and self.job.running:
+                return self.job, False
+            self.job = RefreshJob(stocks or STOCKS, force=force)
+            threading.Thread(target=run_pipeline, args=(self.job,),
+                             name="refresh-pipeline", daemon=True).start()
+            return self.job, True
+
+    def current(self):
+        return self.job
+
+runner = JobRunner()
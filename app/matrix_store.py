@@ -0,0 +1,205 @@
+# app/matrix_store.py
+import argparse, json, os, shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, func
+
+from .settings import MATRIX_DIR
+from .db import SessionLocal
+from .models import Price, RiskScore
+
+"""
+Dates x tickers matrix store, persisted as raw memory-mapped arrays.
+
+    <root>/meta.json              tickers (column order), dates (row order), high-water ids
+    <root>/<field>.<gen>.bin      row-major (len(dates), len(tickers)) array per field
+
+close is float64 (the risk engine computes returns from it, so it must match
+the prices table exactly); volume and the derived score series are float32,
+which is plenty for display. Missing cells are NaN.
+New dates are appended as rows (the .bin files just grow); new tickers or
+back-filled dates rewrite the files, in row chunks, as a new generation.
+meta.json is replaced last and atomically, so a reader always sees a shape
+that matches the files it names. One writer at a time (the risk engine).
+Loading reads only meta.json; the arrays are paged in on access.
+"""
+
+FIELDS = {
+    "close": np.float64,
+    "volume": np.float32,
+    "vol_20d": np.float32,
+    "news_sent_7d": np.float32,
+    "total_score": np.float32,
+}
+PRICE_FIELDS = ("close", "volume")
+SCORE_FIELDS = ("vol_20d", "news_sent_7d", "total_score")
+
+RELAYOUT_ROWS = 4096   # rows copied per step when the layout changes
+
+class MatrixStore:
+    def __init__(self, root=MATRIX_DIR):
+        self.root = Path(root)
+        self.tickers, self.dates, self.marks = [], np.array([], dtype="datetime64[D]"), {}
+        self.gen = 0
+        self._maps = {}
+        if (self.root / "meta.json").exists():
+            meta = json.loads((self.root / "meta.json").read_text())
+            self.tickers = meta["tickers"]
+            self.dates = np.array(meta["dates"], dtype="datetime64[D]")
+            self.marks = meta.get("marks", {})
+            self.gen = meta["gen"]
+        self.index = {t: j for j, t in enumerate(self.tickers)}
+
+    @property
+    def shape(self):
+        return len(self.dates), len(self.tickers)
+
+    def __bool__(self):
+        return len(self.dates) > 0 and len(self.tickers) > 0
+
+    def _path(self, field, gen=None) -> Path:
+        return self.root / f"{field}.{self.gen if gen is None else gen}.bin"
+
+    def field(self, name: str) -> np.ndarray:
+        """Read-only (dates, tickers) memmap for one field."""
+        if name not in self._maps:
+            if not self:
+                return np.empty((0, len(self.tickers)), dtype=FIELDS[name])
+            self._maps[name] = np.memmap(self._path(name), dtype=FIELDS[name], mode="r",
+                                         shape=self.shape)
+        return self._maps[name]
+
+    def series(self, name: str, stock: str, last: int = None) -> np.ndarray:
+        """One stock's column for `name` (last `last` dates); a view, no copy."""
+        col = self.field(name)[:, self.index[stock]]
+        return col if last is None else col[-last:]
+
+    def date_slice(self, start=None, end=None) -> slice:
+        """Row slice covering start <= date <= end."""
+        lo = 0 if start is None else np.searchsorted(self.dates, np.datetime64(start, "D"))
+        hi = len(self.dates) if end is None else np.searchsorted(
+            self.dates, np.datetime64(end, "D"), side="right")
+        return slice(int(lo), int(hi))
+
+    def to_long(self, name: str, stocks=None, start=None) -> pd.DataFrame:
+        """Non-missing cells as stock, date, <name> rows, stock by stock in date order."""
+        cols = [self.index[s] for s in (stocks or self.tickers) if s in self.index]
+        rows = self.date_slice(start)
+        block = np.asarray(self.field(name)[rows][:, cols], dtype=np.float64).T   # stock-major
+        ok = ~np.isnan(block)
+        per_stock = ok.sum(axis=1)
+        return pd.DataFrame({
+            "stock": np.repeat(np.array(self.tickers, dtype=object)[cols], per_stock),
+            "date": np.broadcast_to(self.dates[rows], block.shape)[ok].astype(object),
+            name: block[ok],
+        })
+
+    # --- writing -----------------------------------------------------------------
+
+    def write(self, df: pd.DataFrame, fields, marks=None):
+        """
+        Scatter long-format rows (stock, date, *fields) into the store, appending
+        new dates / tickers as needed. marks: high-water ids to record in meta.
+        """
+        if df.empty:
+            if marks and self.root.exists():
+                self._write_meta({**self.marks, **marks})
+            return
+        days = pd.to_datetime(df["date"]).to_numpy().astype("datetime64[D]")
+        new_tickers = sorted(set(df["stock"]) - set(self.index))
+        new_dates = np.setdiff1d(np.unique(days), self.dates)
+        self.root.mkdir(parents=True, exist_ok=True)
+        old_gen = self.gen
+        if new_tickers or (len(new_dates) and len(self.dates) and new_dates[0] <= self.dates[-1]):
+            self._relayout(self.tickers + new_tickers, np.union1d(self.dates, new_dates))
+        elif len(new_dates):
+            self._append_rows(new_dates)
+
+        rows = np.searchsorted(self.dates, days)
+        cols = np.array([self.index[s] for s in df["stock"]])
+        for f in fields:
+            mm = np.memmap(self._path(f), dtype=FIELDS[f], mode="r+", shape=self.shape)
+            mm[rows, cols] = df[f].to_numpy(dtype=np.float64)
+            mm.flush()
+            del mm
+        self._write_meta({**self.marks, **(marks or {})})
+        if self.gen != old_gen:
+            for f in FIELDS:
+                self._path(f, old_gen).unlink(missing_ok=True)
+
+    def _append_rows(self, new_dates):
+        n = len(self.tickers)
+        for f, dtype in FIELDS.items():
+            with open(self._path(f), "ab") as fh:
+                np.full((len(new_dates), n), np.nan, dtype=dtype).tofile(fh)
+        self.dates = np.concatenate([self.dates, new_dates])
+        self._maps = {}
+
+    # New ticker set and/or date axis: copy every field into next-generation files
+    def _relayout(self, tickers, dates):
+        row_map = np.searchsorted(dates, self.dates)
+        col_map = np.arange(len(self.tickers))   # existing tickers keep their columns
+        for f, dtype in FIELDS.items():
+            out = np.memmap(self._path(f, self.gen + 1), dtype=dtype, mode="w+",
+                            shape=(len(dates), len(tickers)))
+            out[:] = np.nan
+            if self:
+                old = np.memmap(self._path(f), dtype=dtype, mode="r", shape=self.shape)
+                for i in range(0, len(self.dates), RELAYOUT_ROWS):
+                    out[row_map[i:i + RELAYOUT_ROWS, None], col_map] = old[i:i + RELAYOUT_ROWS]
+                del old
+            out.flush()
+            del out
+        self.gen += 1
+        self.tickers, self.dates = list(tickers), np.asarray(dates, dtype="datetime64[D]")
+        self.index = {t: j for j, t in enumerate(self.tickers)}
+        self._maps = {}
+
+    def _write_meta(self, marks):
+        self.marks = marks
+        meta = {"gen": self.gen, "tickers": self.tickers, "dates": [str(d) for d in self.dates],
+                "fields": {f: np.dtype(t).name for f, t in FIELDS.items()}, "marks": marks}
+        tmp = self.root / ".meta.json.tmp"
+        tmp.write_text(json.dumps(meta))
+        os.replace(tmp, self.root / "meta.json")
+
+# --- sync from the SQL tables ----------------------------------------------------
+
+def sync_prices(s, store=None) -> int:
+    """Copy prices rows added since the last sync (by id) into close/volume."""
+    store = store if store is not None else MatrixStore()
+    last_id = store.marks.get("price_id", 0)
+    top = s.execute(select(func.max(Price.id))).scalar() or 0
+    df = pd.read_sql(
+        select(Price.stock, Price.date, Price.close, Price.volume)
+        .where(Price.id > last_id, Price.id <= top),
+        s.connection(),
+    )
+    store.write(df, PRICE_FIELDS, marks={"price_id": top})
+    return len(df)
+
+def sync_scores(s, start=None, store=None) -> int:
+    """Copy risk_scores rows dated on/after `start` (all if None) into the score fields."""
+    store = store if store is not None else MatrixStore()
+    q = select(RiskScore.stock, RiskScore.date, *[getattr(RiskScore, f) for f in SCORE_FIELDS])
+    if start is not None:
+        q = q.where(RiskScore.date >= start)
+    df = pd.read_sql(q, s.connection())
+    store.write(df, SCORE_FIELDS)
+    return len(df)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync the matrix store from the SQL tables.")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="delete the store and rebuild it from scratch")
+    args = parser.parse_args()
+    if args.rebuild:
+        shutil.rmtree(MATRIX_DIR, ignore_errors=True)
+    with SessionLocal() as s:
+        store = MatrixStore()
+        n_prices = sync_prices(s, store)
+        n_scores = sync_scores(s, None, store)
+    print(f"Matrix store {store.shape[0]} dates x {store.shape[1]} tickers "
+          f"(+{n_prices} price rows, {n_scores} score rows).")
@@ -0,0 +1,137 @@
+# app/metrics.py
+import functools, json, os, threading, time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .settings import METRICS, METRICS_DIR, METRICS_PROM
+
+"""
+Lightweight per-stage instrumentation for the ETLs and the risk engine.
+Each stage accumulates calls, wall time, rows, bytes fetched, retries and
+sleep time. At the end of a run the totals are written as a JSON run report
+(and optionally a Prometheus text-format file for node_exporter's textfile
+collector). When METRICS is off, stage() hands back a shared no-op object,
+so instrumented code pays one attribute check per call.
+"""
+
+COUNTERS = ("rows", "bytes", "retries", "sleep_s")
+
+class _NullStage:
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        return False
+    def add(self, **counts):
+        pass
+
+NULL_STAGE = _NullStage()
+
+class _Stage:
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+        self.counts = {}
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        self.registry._record(self.name, time.perf_counter() - self.t0, self.counts,
+                              error=exc_type is not None)
+        return False
+
+    def add(self, **counts):
+        for k, v in counts.items():
+            self.counts[k] = self.counts.get(k, 0) + v
+
+class Metrics:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.stages = {}
+        self.started = time.perf_counter()
+        self.started_at = datetime.now(timezone.utc)
+
+    def stage(self, name):
+        """Context manager timing one execution of `name`; use .add(rows=..) to attribute counts."""
+        return _Stage(self, name) if self.enabled else NULL_STAGE
+
+    def timed(self, name, rows=None):
+        """Decorator form of stage(); rows(result) gives the row count to record."""
+        def deco(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with self.stage(name) as m:
+                    out = fn(*args, **kwargs)
+                    if rows is not None:
+                        m.add(rows=rows(out))
+                return out
+            return wrapper
+        return deco
+
+    def add(self, name, **counts):
+        """Counts without timing (e.g. retries or sleep inside another stage)."""
+        if self.enabled:
+            self._record(name, 0.0, counts, calls=0)
+
+    def _record(self, name, seconds, counts, error=False, calls=1):
+        with self.lock:
+            st = self.stages.setdefault(
+                name, {"calls": 0, "errors": 0, "seconds": 0.0, **{c: 0 for c in COUNTERS}})
+            st["calls"] += calls
+            st["errors"] += int(error)
+            st["seconds"] += seconds
+            for k, v in counts.items():
+                st[k] = st.get(k, 0) + v
+
+    def report(self, entry: str) -> dict:
+        with self.lock:
+            stages = {k: {m: round(v, 6) if isinstance(v, float) else v for m, v in st.items()}
+                      for k, st in sorted(self.stages.items())}
+        return {
+            "entry": entry,
+            "started_at": self.started_at.isoformat(),
+            "wall_seconds": round(time.perf_counter() - self.started, 6),
+            "pid": os.getpid(),
+            "stages": stages,
+        }
+
+    def prometheus(self, report: dict) -> str:
+        entry = report["entry"]
+        lines = [
+            "# HELP risk_run_wall_seconds Wall time of the last run.",
+            "# TYPE risk_run_wall_seconds gauge",
+            f'risk_run_wall_seconds{{entry="{entry}"}} {report["wall_seconds"]}',
+        ]
+        for metric in ("calls", "errors", "seconds") + COUNTERS:
+            name = "risk_stage_" + metric.replace("sleep_s", "sleep_seconds")
+            lines.append(f"# HELP {name} Per-stage {metric} in the last run.")
+            lines.append(f"# TYPE {name} gauge")
+            for stage, st in report["stages"].items():
+                lines.append(f'{name}{{entry="{entry}",stage="{stage}"}} {st.get(metric, 0)}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, entry: str, out_dir=METRICS_DIR, prom=METRICS_PROM):
+        """Write <out_dir>/<entry>-<timestamp>.json and, if prom, <out_dir>/<entry>.prom."""
+        if not self.enabled:
+            return None
+        rep = self.report(entry)
+        out = Path(out_dir)
+        out.mkdir(parents=True, exist_ok=True)
+        stamp = self.started_at.strftime("%Y%m%dT%H%M%SZ")
+        path = out / f"{entry}-{stamp}.json"
+        path.write_text(json.dumps(rep, indent=2))
+        if prom:
+            tmp = out / f".{entry}.prom.tmp"
+            tmp.write_text(self.prometheus(rep))
+            os.replace(tmp, out / f"{entry}.prom")   # collectors never read half a file
+        print(f"Metrics written to {path}")
+        return path
+
+metrics = Metrics(enabled=METRICS)
@@ -0,0 +1,120 @@
+# app/migrate.py
+import argparse, json
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, inspect, select, text
+from sqlalchemy.orm import Session
+
+from .db import Base, engine
+from . import models  # noqa: F401  (registers tables on Base.metadata)
+from .models import NewsPayload
+
+"""
+Schema migrations for existing databases (e.g. an old risk.db).
+create_all() only adds missing tables, so changes to existing tables live
+here as named steps, applied once each and recorded in schema_migrations.
+
+    python -m app.migrate            # apply pending steps
+    python -m app.migrate --list     # show applied / pending
+"""
+
+_meta = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _meta,
+    Column("name", String, primary_key=True),
+    Column("applied_at", DateTime),
+)
+
+# Add any model index the table doesn't have yet (composite/covering indexes)
+def _add_indexes(conn):
+    insp = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        if not insp.has_table(table.name):
+            continue
+        existing = {ix["name"] for ix in insp.get_indexes(table.name)}
+        for ix in table.indexes:
+            if ix.name not in existing:
+                print(f"  create index {ix.name} on {table.name}")
+                ix.create(bind=conn)
+
+# Switch an SQLite file to WAL (persistent; the pragma in db.py only requests it)
+def _sqlite_wal(conn):
+    if conn.dialect.name == "sqlite":
+        mode = conn.exec_driver_sql("PRAGMA journal_mode=WAL").scalar()
+        print(f"  journal_mode={mode}")
+
+# Move the inline news.raw article JSON into the compressed news_payloads
+# archive (one row per URL), in id-ordered chunks, then drop the column.
+# SQLite keeps the freed pages until the file is VACUUMed.
+def _archive_news_raw(conn, chunk_rows=5000):
+    from .news_archive import archive   # pandas; only needed by this step
+    import pandas as pd
+    NewsPayload.__table__.create(bind=conn, checkfirst=True)
+    if "raw" not in {c["name"] for c in inspect(conn).get_columns("news")}:
+        return
+    s = Session(bind=conn)   # joins this step's transaction
+    # archive() merges each chunk into what earlier chunks stored, so the
+    # entities of every copy of a URL end up in its one payload
+    last, urls = 0, set()
+    while True:
+        rows = conn.execute(text(
+            "SELECT id, url, raw FROM news WHERE id > :last AND raw IS NOT NULL "
+            "ORDER BY id LIMIT :n"), {"last": last, "n": chunk_rows}).all()
+        if not rows:
+            break
+        last = rows[-1][0]
+        df = pd.DataFrame({
+            "url": [r[1] for r in rows],
+            "raw": [json.loads(r[2]) if isinstance(r[2], (str, bytes)) else r[2] for r in rows],
+        })
+        archive(s, df)
+        urls.update(df["url"].dropna())
+    conn.execute(text("ALTER TABLE news DROP COLUMN raw"))
+    print(f"  archived {len(urls)} payloads, dropped news.raw")
+
+# (name, fn(conn)) in order; names are never reused
+MIGRATIONS = [
+    ("0001_create_tables", lambda conn: Base.metadata.create_all(bind=conn)),
+    ("0002_access_path_indexes", _add_indexes),
+    ("0003_sqlite_wal", _sqlite_wal),
+    ("0004_news_payload_archive", _archive_news_raw),
+]
+
+def applied(conn) -> set:
+    _meta.create_all(bind=conn)
+    return set(conn.execute(select(schema_migrations.c.name)).scalars())
+
+def migrate(analyze=True) -> list:
+    """Apply pending migrations in order (each in its own transaction). Returns their names."""
+    done = []
+    with engine.begin() as conn:
+        seen = applied(conn)
+    for name, step in MIGRATIONS:
+        if name in seen:
+            continue
+        print(f"Applying {name}")
+        with engine.begin() as conn:
+            step(conn)
+            conn.execute(schema_migrations.insert().values(
+                name=name, applied_at=datetime.now(timezone.utc)))
+        done.append(name)
+    if analyze:
+        # Refresh planner statistics so the new indexes get used
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+    print(f"Migrations applied: {len(done)}" if done else "Schema up to date.")
+    return done
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply schema migrations to the database.")
+    parser.add_argument("--list", action="store_true", help="show applied and pending migrations")
+    parser.add_argument("--no-analyze", dest="analyze", action="store_false",
+                        help="skip refreshing planner statistics")
+    args = parser.parse_args()
+    if args.list:
+        with engine.begin() as conn:
+            seen = applied(conn)
+        for name, _ in MIGRATIONS:
+            print(f"[{'x' if name in seen else ' '}] {name}")
+    else:
+        migrate(analyze=args.analyze)
@@ -1,11 +1,17 @@
-from sqlalchemy import Column, Integer, String, Date, Float, Text, UniqueConstraint
-from sqlalchemy.dialects.sqlite import JSON as SQLiteJSON
+from sqlalchemy import (
+    Column, Integer, String, Date, DateTime, Float, Text, LargeBinary, UniqueConstraint, Index,
+)
 from .db import Base
 
 """
 This file uses SQLAlchemy ORM to define classes (Price, News, RiskScore).
 Each class maps to a table in the database (prices, news, risk_scores).
 Each class attribute (like stock, date, close) maps to a column in that table.
+
+Besides the unique keys, the composite indexes below cover the hot reads, so
+they are answered from the index alone (run app/migrate.py on older DBs):
+    risk_engine   prices (stock, date, close), news (stock, published_at, sentiment)
+    dashboard     risk_scores by stock ordered by date; movers window by date
 """
 class Price(Base):
     __tablename__ = "prices"
@@ -17,7 +23,10 @@ class Price(Base):
     low = Column(Float)
     close = Column(Float)
     volume = Column(Float)
-    __table_args__ = (UniqueConstraint("stock", "date", name="uix_price_stock_date"),)
+    __table_args__ = (
+        UniqueConstraint("stock", "date", name="uix_price_stock_date"),
+        Index("ix_prices_stock_date_close", "stock", "date", "close"),
+    )
 
 class News(Base):
     __tablename__ = "news"
@@ -28,8 +37,20 @@ class News(Base):
     url = Column(Text)
     source = Column(String)
     sentiment = Column(Float)
-    raw = Column(SQLiteJSON)   # JSON for extra fields
-    __table_args__ = (UniqueConstraint("stock", "published_at", "title", name="uix_news_unique"),)
+    __table_args__ = (
+        UniqueConstraint("stock", "published_at", "title", name="uix_news_unique"),
+        Index("ix_news_stock_published_sentiment", "stock", "published_at", "sentiment"),
+    )
+
+# Full Marketaux article JSON, gzip-compressed, once per URL however many
+# tickers carry the article (news.url -> url). Kept out of the news table so
+# its rows stay narrow; read on demand through app/news_archive.py.
+class NewsPayload(Base):
+    __tablename__ = "news_payloads"
+    url = Column(Text, primary_key=True)
+    payload = Column(LargeBinary)      # gzip(JSON)
+    size = Column(Integer)             # uncompressed bytes
+    stored_at = Column(DateTime)
 
 class RiskScore(Base):
     __tablename__ = "risk_scores"
@@ -41,4 +62,56 @@ class RiskScore(Base):
     vol_z = Column(Float)
     sent_z = Column(Float)
     total_score = Column(Float)
-    __table_args__ = (UniqueConstraint("stock", "date", name="uix_risk_stock_date"),)
+    __table_args__ = (
+        UniqueConstraint("stock", "date", name="uix_risk_stock_date"),
+        Index("ix_risk_stock_date_series", "stock", "date",
+              "total_score", "vol_20d", "news_sent_7d"),
+        Index("ix_risk_date_stock_score", "date", "stock", "total_score"),
+    )
+
+class ScoreWatermark(Base):
+    __tablename__ = "score_watermarks"
+    stock = Column(String, primary_key=True)
+    last_date = Column(Date)           # last date scored for this stock
+    last_price_id = Column(Integer)    # highest prices.id seen at that run
+    last_news_id = Column(Integer)     # highest news.id seen at that run
+
+class SentimentCache(Base):
+    __tablename__ = "sentiment_cache"
+    key = Column(String, primary_key=True)   # sha1 of whitespace-normalized title
+    compound = Column(Float)
+
+class RiskMover(Base):
+    __tablename__ = "risk_movers"
+    stock = Column(String, primary_key=True)
+    latest = Column(Date)                 # latest scored date for the stock
+    now = Column(Float)                   # total_score on that date
+    prev = Column(Float)                  # total_score 7 days earlier
+    delta_1d = Column(Float)
+    delta_7d = Column(Float, index=True)
+    delta_30d = Column(Float)
+
+class RefreshLog(Base):
+    __tablename__ = "refresh_log"
+    stock = Column(String, primary_key=True)
+    source = Column(String, primary_key=True)   # "prices" or "news"
+    refreshed_on = Column(Date)                 # UTC day of the last successful fetch + load
+
+class BackfillCheckpoint(Base):
+    __tablename__ = "backfill_checkpoints"
+    stock = Column(String, primary_key=True)
+    status = Column(String)        # "done" or "failed"
+    since = Column(Date)           # start of the requested range (NULL = full history)
+    first_date = Column(Date)      # range actually returned by the API
+    last_date = Column(Date)
+    rows = Column(Integer)         # rows inserted
+    error = Column(Text)
+    updated_at = Column(DateTime)
+
+class RiskFeature(Base):
+    __tablename__ = "risk_features"
+    stock = Column(String, primary_key=True)
+    date = Column(Date, primary_key=True)
+    feature = Column(String, primary_key=True)   # e.g. "vol_60d", "sent_30d"
+    value = Column(Float)
+    __table_args__ = (Index("ix_risk_features_date_feature", "date", "feature"),)
@@ -0,0 +1,113 @@
+# app/news_archive.py
+import gzip, json
+from datetime import datetime, timezone
+
+import pandas as pd
+from sqlalchemy import select
+
+from .settings import LOAD_CHUNK_SIZE
+from .db import SessionLocal, dialect_insert
+from .bulk import copy_supported, copy_merge
+from .models import NewsPayload
+
+"""
+Archive of full article payloads, split out of the news table.
+Each Marketaux article JSON is stored once per URL (a story carried by
+several tickers shares one row, with every ticker's entities merged in),
+gzip-compressed, in news_payloads. Nothing on the scoring or dashboard
+paths reads it; callers that want the extra fields ask for them explicitly:
+
+    load_payload(url)             # one article dict (or None)
+    load_payloads(urls)           # {url: article dict}
+"""
+
+# Compact, key-sorted JSON so equal payloads compress to equal bytes
+def _encode(payload) -> bytes:
+    return json.dumps(payload, separators=(",", ":"), sort_keys=True).encode("utf-8")
+
+def pack(payload) -> bytes:
+    return gzip.compress(_encode(payload), compresslevel=6, mtime=0)
+
+def unpack(blob: bytes):
+    return json.loads(gzip.decompress(blob))
+
+# One payload per URL: the first copy, with the `entities` of every copy
+# (each ticker's fetch lists its own symbol's match) merged in, first seen first.
+# Entities are told apart by symbol, or by their JSON when they have none.
+def _merge(copies):
+    base, entities, seen = None, [], set()
+    for p in copies:
+        if not isinstance(p, dict):
+            continue
+        if base is None:
+            base = p
+        for e in p.get("entities") or []:
+            key = e.get("symbol") if isinstance(e, dict) and e.get("symbol") else _encode(e)
+            if key not in seen:
+                seen.add(key)
+                entities.append(e)
+    if base is None or not entities:
+        return base
+    return {**base, "entities": entities}
+
+def archive(s, df: pd.DataFrame, chunk_size: int = LOAD_CHUNK_SIZE) -> int:
+    """
+    Store the `raw` payloads of a news frame (url, raw columns) under their URL.
+    Copies of one URL, in the frame and already archived, are merged into one
+    payload carrying every copy's entities; archived payloads that gain no
+    entities are left as they are. Runs on the caller's session; the caller
+    commits. Returns payloads written (new or updated).
+    """
+    if df.empty or "raw" not in df.columns:
+        return 0
+    df = df[df["url"].notna() & df["raw"].notna()]
+    if df.empty:
+        return 0
+    copies = df.groupby("url", sort=False)["raw"].agg(list)
+    stored = load_payloads(copies.index, s)
+    merged = {}
+    for url, new in copies.items():
+        payload = _merge([stored[url], *new] if url in stored else new)
+        if payload is not None and payload != stored.get(url):
+            merged[url] = payload
+    if not merged:
+        return 0
+    encoded = [_encode(p) for p in merged.values()]
+    rows = pd.DataFrame({
+        "url": list(merged),
+        "payload": [gzip.compress(b, compresslevel=6, mtime=0) for b in encoded],
+        "size": [len(b) for b in encoded],
+        "stored_at": datetime.now(timezone.utc),
+    })
+    update = ["payload", "size", "stored_at"]
+    if copy_supported(s.bind):
+        return copy_merge(s, NewsPayload.__table__, rows, keys=["url"], update=update)
+    stmt = dialect_insert(NewsPayload.__table__, s.bind)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["url"],
+        set_={c: stmt.excluded[c] for c in update},
+    ).returning(NewsPayload.url)
+    records = rows.to_dict("records")
+    written = 0
+    for i in range(0, len(records), chunk_size):
+        written += len(s.execute(stmt, records[i:i + chunk_size]).all())
+    return written
+
+def load_payloads(urls, s=None) -> dict:
+    """Decompressed payloads for the given URLs ({url: dict}); unknown URLs are left out."""
+    urls = [u for u in dict.fromkeys(urls) if u]
+    if not urls:
+        return {}
+    if s is None:
+        with SessionLocal() as s:
+            return load_payloads(urls, s)
+    out = {}
+    for i in range(0, len(urls), LOAD_CHUNK_SIZE):
+        q = select(NewsPayload.url, NewsPayload.payload).where(
+            NewsPayload.url.in_(urls[i:i + LOAD_CHUNK_SIZE]))
+        out.update((u, unpack(b)) for u, b in s.execute(q))
+    return out
+
+def load_payload(url, s=None):
+    """One article's payload, or None if it was never archived."""
+    return load_payloads([url], s).get(url)
@@ -0,0 +1,94 @@
+# app/response_cache.py
+import gzip, hashlib, json, os, threading, time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .settings import RESPONSE_CACHE_DIR, RESPONSE_CACHE_TTL_HOURS, RESPONSE_CACHE_MAX_MB
+
+"""
+On-disk cache of raw API payloads (gzip-compressed JSON).
+Entries are addressed by a hash of endpoint + params (API keys excluded) and
+stored one file per fetch date:  <root>/<hash[:2]>/<hash>/<YYYY-MM-DD>.json.gz
+Live runs only read it with RESPONSE_CACHE_READ=1, reusing today's entry
+while it is younger than the TTL; replay runs
+read the most recent entry for a request regardless of age, so a whole
+pipeline can be re-run offline after a parsing or scoring change.
+"""
+
+# Query params that must never influence the key (or end up on disk)
+SECRET_PARAMS = {"apikey", "api_token"}
+
+class ResponseCache:
+    def __init__(self, root=RESPONSE_CACHE_DIR, ttl_hours=RESPONSE_CACHE_TTL_HOURS,
+                 max_mb=RESPONSE_CACHE_MAX_MB):
+        self.root = Path(root)
+        self.ttl = ttl_hours * 3600
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.lock = threading.Lock()
+        self._size = None   # bytes on disk, computed lazily
+
+    @staticmethod
+    def key(endpoint: str, params: dict) -> str:
+        clean = {k: str(v) for k, v in params.items() if k not in SECRET_PARAMS}
+        blob = json.dumps([endpoint, clean], sort_keys=True)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def _dir(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    @staticmethod
+    def _today() -> str:
+        return datetime.now(timezone.utc).date().isoformat()
+
+    @staticmethod
+    def _read(path: Path):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return json.load(f)
+
+    def get(self, endpoint, params, day=None):
+        """Payload fetched on `day` (default today) if still within the TTL, else None."""
+        path = self._dir(self.key(endpoint, params)) / f"{day or self._today()}.json.gz"
+        try:
+            if time.time() - path.stat().st_mtime > self.ttl:
+                return None
+            return self._read(path)
+        except FileNotFoundError:
+            return None
+
+    def latest(self, endpoint, params):
+        """Most recently fetched payload for this request, ignoring the TTL (replay)."""
+        d = self._dir(self.key(endpoint, params))
+        files = sorted(d.glob("*.json.gz")) if d.is_dir() else []
+        return self._read(files[-1]) if files else None
+
+    def put(self, endpoint, params, payload, day=None):
+        with self.lock:
+            if self._size is None:
+                self._size = self._disk_size()
+        d = self._dir(self.key(endpoint, params))
+        d.mkdir(parents=True, exist_ok=True)
+        path = d / f"{day or self._today()}.json.gz"
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+            json.dump(payload, f)
+        old = path.stat().st_size if path.exists() else 0
+        os.replace(tmp, path)   # atomic: readers never see a partial file
+        with self.lock:
+            self._size += path.stat().st_size - old
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _disk_size(self) -> int:
+        return sum(p.stat().st_size for p in self.root.rglob("*.json.gz"))
+
+    # Size-based eviction: drop the oldest entries until under max_bytes
+    def _evict(self):
+        files = sorted(self.root.rglob("*.json.gz"), key=lambda p: p.stat().st_mtime)
+        for p in files:
+            if self._size <= self.max_bytes:
+                break
+            size = p.stat().st_size
+            p.unlink(missing_ok=True)
+            self._size -= size
+
+cache = ResponseCache()
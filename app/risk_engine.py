@@ -1,8 +1,19 @@
 # app/risk_engine.py
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+import numpy as np
 import pandas as pd
-from sqlalchemy import select
-from .db import SessionLocal
-from .models import Price, News, RiskScore
+from sqlalchemy import select, func
+from .settings import (
+    LOAD_CHUNK_SIZE, RISK_METHOD, RISK_SHARD_SIZE, RISK_DATE_CHUNK, RISK_WORKERS, MATRIX_STORE,
+    RISK_VOL_WINDOWS, RISK_SENT_WINDOWS, RISK_WEIGHTS, RISK_STORE_FEATURES,
+)
+from .db import Base, SessionLocal, engine, dialect_insert
+from .bulk import copy_supported, copy_merge
+from .models import Price, News, RiskScore, ScoreWatermark, RiskMover, RiskFeature
+from .metrics import metrics
+from .matrix_store import MatrixStore, sync_prices, sync_scores
 
 """
 This file combines price and news data to compute daily stock risk scores.
@@ -66,27 +77,211 @@ def _zscore(s: pd.Series) -> pd.Series:
         return (s - mu)  # all zeros if sd==0
     return (s - mu) / sd
 
-# Orchestrate: load data, compute volatility + sentiment, calculate
-# risk scores, and save into DB
-def write_risk_scores():
-    # 1) Pull prices & news from DB
-    with SessionLocal() as s:
-        prices = pd.read_sql(select(Price), s.bind)
-        news   = pd.read_sql(select(News),  s.bind)
+# --- Vectorized engine -------------------------------------------------------
+# Same outputs as the functions above, without per-stock / per-date Python
+# loops, and for several window lengths at once (multi-horizon features).
+# Stocks are laid out one per row of a 2-D block; each row gets cumulative
+# sums (count, sum, sum of squares) once and every window is a difference of
+# two of them, so all horizons cost one O(n) pass. Values are shifted by the
+# row's first value first, which keeps the sums small and the variance
+# formula stable. Sums never cross rows, so a stock's features don't depend on
+# which other stocks are scored with it (ticker shards give identical output).
 
-    if prices.empty:
-        print("No prices found; run etl_prices first.")
-        return
+GROUP_BLOCK = 128   # stocks per 2-D block (bounds the temporaries)
+
+# Moving "mean" or "std" (ddof=1) of a flat, group-sorted array for each window
+# length in `windows`. Windows with fewer than min_count values give NaN
+# (default: a full window for std, one value for mean). Returns {window: array}.
+def _grouped_windows(kind: str, values: np.ndarray, group_sizes: np.ndarray, windows,
+                     min_count=None) -> dict:
+    out = {w: np.empty(len(values)) for w in windows}
+    starts = np.concatenate(([0], np.cumsum(group_sizes)[:-1])).astype(int)
+    for g in range(0, len(group_sizes), GROUP_BLOCK):
+        sizes = group_sizes[g:g + GROUP_BLOCK]
+        lo, hi = starts[g], starts[g] + sizes.sum()
+        row = np.repeat(np.arange(len(sizes)), sizes)
+        col = np.arange(hi - lo) - np.repeat(starts[g:g + GROUP_BLOCK] - lo, sizes)
+
+        x = np.full((len(sizes), sizes.max()), np.nan)
+        x[row, col] = values[lo:hi]
+        ok = ~np.isnan(x)
+        shift = x[np.arange(len(sizes)), ok.argmax(axis=1)]   # first value of each row
+        shift[np.isnan(shift)] = 0.0
+        x = np.where(ok, x - shift[:, None], 0.0)
+
+        zero = np.zeros((len(sizes), 1))
+        cnt = np.hstack([zero, np.cumsum(ok, axis=1)])
+        s1 = np.hstack([zero, np.cumsum(x, axis=1)])
+        if kind == "std":
+            s2 = np.hstack([zero, np.cumsum(x * x, axis=1)])
+
+        end = col + 1
+        for w in windows:
+            begin = np.maximum(end - w, 0)
+            n = cnt[row, end] - cnt[row, begin]
+            a = s1[row, end] - s1[row, begin]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                if kind == "std":
+                    b = s2[row, end] - s2[row, begin]
+                    res = np.sqrt(np.maximum(b - a * a / n, 0.0) / (n - 1))
+                    need = max(w if min_count is None else min_count, 2)
+                else:
+                    res = a / n + shift[row]
+                    need = 1 if min_count is None else min_count
+            res[n < need] = np.nan
+            out[w][lo:hi] = res
+    return out
+
+# Rolling std of daily returns (vol_<w>d for each window) for every stock at once
+def _compute_volatility_vec(prices: pd.DataFrame, windows=(20,)) -> pd.DataFrame:
+    prices = _compute_daily_returns(prices)
+    sizes = prices.groupby("stock", sort=True).size().to_numpy()
+    vols = _grouped_windows("std", prices["ret"].to_numpy(dtype=float), sizes, windows)
+    return pd.DataFrame({"stock": prices["stock"].to_numpy(),
+                         "date": prices["date"].to_numpy(),
+                         **{f"vol_{w}d": vols[w] for w in windows}})
+
+# Rolling mean of daily news sentiment (sent_<w>d for each window) on a
+# continuous daily grid per stock
+def _compute_news_sentiment_vec(news: pd.DataFrame, windows=(7,)) -> pd.DataFrame:
+    if news.empty:
+        return pd.DataFrame(columns=["stock", "date"] + [f"sent_{w}d" for w in windows])
+    day = pd.to_datetime(news["published_at"]).dt.tz_localize(None).dt.normalize()
+    daily = news["sentiment"].groupby([news["stock"], day]).mean()   # sorted by stock, day
+    stocks = daily.index.get_level_values(0)
+    days = daily.index.get_level_values(1)
+
+    # One grid row per calendar day between each stock's first and last article
+    first = days.to_series().groupby(stocks).min()
+    last = days.to_series().groupby(stocks).max()
+    sizes = ((last - first).dt.days + 1).to_numpy()
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    offsets = np.arange(sizes.sum()) - np.repeat(starts, sizes)
+
+    grid = np.full(sizes.sum(), np.nan)
+    stock_no = np.repeat(np.arange(len(sizes)), daily.groupby(level=0).size().to_numpy())
+    grid[starts[stock_no] + (days - first.to_numpy()[stock_no]).days] = daily.to_numpy()
+    sents = _grouped_windows("mean", grid, sizes, windows)
+
+    grid_days = np.repeat(first.to_numpy(), sizes) + pd.to_timedelta(offsets, unit="D")
+    return pd.DataFrame({"stock": np.repeat(first.index.to_numpy(), sizes),
+                         "date": pd.DatetimeIndex(grid_days).date,
+                         **{f"sent_{w}d": sents[w] for w in windows}})
+
+# Per-date z-score of a column across stocks, via grouped transforms
+def _zscore_by(s: pd.Series, keys: pd.Series) -> pd.Series:
+    g = s.groupby(keys, sort=False)
+    mu = g.transform("mean")
+    sd = g.transform("std", ddof=0)
+    sd = sd.where((sd != 0) & sd.notna(), 1.0)   # sd==0: leave (s - mu), as _zscore does
+    return (s - mu) / sd
+
+# Feature horizons; vol_20d and sent_7d are always computed since risk_scores
+# stores them (vol_20d, news_sent_7d) along with their z-scores
+VOL_WINDOWS = tuple(sorted(set(RISK_VOL_WINDOWS) | {20}))
+SENT_WINDOWS = tuple(sorted(set(RISK_SENT_WINDOWS) | {7}))
+FEATURES = [f"vol_{w}d" for w in VOL_WINDOWS] + [f"sent_{w}d" for w in SENT_WINDOWS]
 
-    # 2) Compute features
+# Horizons _features computes: every one while RISK_STORE_FEATURES keeps them
+# all, otherwise the two risk_scores stores plus the weighted ones
+def _windows(weights=RISK_WEIGHTS) -> tuple:
+    wanted = set(FEATURES) if RISK_STORE_FEATURES else {"vol_20d", "sent_7d", *weights}
+    return (tuple(w for w in VOL_WINDOWS if f"vol_{w}d" in wanted),
+            tuple(w for w in SENT_WINDOWS if f"sent_{w}d" in wanted))
+
+# Calendar-day lookbacks needed to rebuild the rolling windows for a date:
+# the longest computed vol window in trading days (+1 close for pct_change,
+# with room for weekends and holidays; 45 days for 20) and the longest news window
+PRICE_LOOKBACK_DAYS = max(_windows()[0]) * 3 // 2 + 15
+NEWS_LOOKBACK_DAYS = max(_windows()[1]) - 1
+
+# Top Risk Movers: deltas over these calendar-day horizons, computed from the
+# last MOVERS_WINDOW_DAYS of scores
+MOVER_HORIZONS = (1, 7, 30)
+MOVERS_WINDOW_DAYS = 60
+
+# Pull prices & news from DB, optionally only what is needed to score from `start`
+# and only for `stocks`. Reads just the columns the scoring uses.
+# With a MatrixStore, closes come from its memory-mapped close matrix instead.
+def _load_inputs(s, start=None, stocks=None, store=None):
+    price_q = select(Price.stock, Price.date, Price.close)
+    news_q = select(News.stock, News.published_at, News.sentiment)
+    if start is not None:
+        price_q = price_q.where(Price.date >= start - timedelta(days=PRICE_LOOKBACK_DAYS))
+        news_q = news_q.where(
+            News.published_at >= (start - timedelta(days=NEWS_LOOKBACK_DAYS)).isoformat()
+        )
+    if stocks is not None:
+        price_q = price_q.where(Price.stock.in_(stocks))
+        news_q = news_q.where(News.stock.in_(stocks))
+    if store is not None:
+        since = None if start is None else start - timedelta(days=PRICE_LOOKBACK_DAYS)
+        prices = store.to_long("close", stocks, since)
+    else:
+        prices = pd.read_sql(price_q, s.connection())
+    news = pd.read_sql(news_q, s.connection())
+    return prices, news
+
+# Compute volatility + sentiment and the per-day cross-sectional risk score.
+# method="vectorized" (default) avoids per-group Python loops; method="loop"
+# is the original per-stock / per-date implementation, kept for comparison.
+# The loop method only knows the original two features and weights.
+def _score(prices: pd.DataFrame, news: pd.DataFrame, method: str = RISK_METHOD,
+           weights: dict = RISK_WEIGHTS) -> pd.DataFrame:
+    if method == "loop":
+        if weights != {"vol_20d": 0.6, "sent_7d": -0.4}:
+            raise ValueError("The loop method only supports the default weights")
+        return _score_loop(prices, news)
+    if method != "vectorized":
+        raise ValueError(f"Unknown risk method: {method}")
+
+    return _cross_section(_features(prices, news, weights), weights)
+
+# Per-stock features (stock, date, the _windows() columns, news_sent_7d);
+# independent across stocks. Days without news count as neutral sentiment.
+def _features(prices: pd.DataFrame, news: pd.DataFrame,
+              weights: dict = RISK_WEIGHTS) -> pd.DataFrame:
+    vol_windows, sent_windows = _windows(weights)
+    vol  = _compute_volatility_vec(prices, vol_windows)       # stock, date, vol_<w>d
+    sent = _compute_news_sentiment_vec(news, sent_windows)    # stock, date, sent_<w>d
+    df = pd.merge(vol, sent, on=["stock", "date"], how="left")
+    sent_cols = [f"sent_{w}d" for w in sent_windows]
+    df[sent_cols] = df[sent_cols].fillna(0.0)
+    df["news_sent_7d"] = df["sent_7d"]
+    return df
+
+# Per-date z-scores and total score; only needs the rows of the dates involved.
+# total_score = sum of weight * per-date z-score over the weighted features;
+# vol features missing for a stock (short history) take the day's median.
+def _cross_section(df: pd.DataFrame, weights: dict = RISK_WEIGHTS) -> pd.DataFrame:
+    unknown = set(weights) - set(FEATURES)
+    if unknown:
+        raise ValueError(f"Weights for unknown features: {sorted(unknown)} (have {FEATURES})")
+    df = df.sort_values(["date", "stock"], kind="stable").reset_index(drop=True)
+    day = pd.to_datetime(df["date"])
+    z = {}
+    for f in dict.fromkeys(["vol_20d", "sent_7d", *weights]):
+        col = df[f]
+        if f.startswith("vol_"):
+            col = col.fillna(col.groupby(day, sort=False).transform("median"))
+        z[f] = _zscore_by(col, day)
+    df["vol_z"]  = z["vol_20d"]
+    df["sent_z"] = z["sent_7d"]
+    total = None
+    for f, w in weights.items():
+        total = w * z[f] if total is None else total + w * z[f]
+    df["total_score"] = total
+    return df
+
+def _score_loop(prices: pd.DataFrame, news: pd.DataFrame) -> pd.DataFrame:
     vol  = _compute_volatility(prices)       # stock, date, vol_20d
     sent = _compute_news_sentiment(news)     # stock, date, news_sent_7d
 
-    # 3) Join; fill missing sentiment with 0 (neutral)
+    # Join; fill missing sentiment with 0 (neutral)
     df = pd.merge(vol, sent, on=["stock", "date"], how="left")
     df["news_sent_7d"] = df["news_sent_7d"].fillna(0.0)
 
-    # 4) Z-score per day across stocks, then total risk score
+    # Z-score per day across stocks, then total risk score
     out = []
     for d, g in df.groupby("date"):
         g = g.copy()
@@ -96,32 +291,363 @@ def write_risk_scores():
         g["sent_z"] = _zscore(g["news_sent_7d"])
         g["total_score"] = 0.6 * g["vol_z"] + 0.4 * (-g["sent_z"])
         out.append(g[["stock","date","vol_20d","news_sent_7d","vol_z","sent_z","total_score"]])
-    out = pd.concat(out, ignore_index=True)
+    return pd.concat(out, ignore_index=True)
 
-    # 5) Upsert into DB
+# Earliest date whose score may have changed since the last run: the first
+# newly loaded price date, or the day of any late-arriving article. Because
+# sentiment is only carried for 7 days after a stock's last article, new news
+# also touches the days right after that stock's previous last article.
+# Returns None when nothing changed; raises LookupError when never scored.
+def _affected_start(s):
+    marks = s.execute(select(ScoreWatermark)).scalars().all()
+    if not marks:
+        raise LookupError("no watermarks yet")
+    last_price_id = min(m.last_price_id or 0 for m in marks)
+    last_news_id  = min(m.last_news_id or 0 for m in marks)
+
+    starts = []
+    first_price = s.execute(
+        select(func.min(Price.date)).where(Price.id > last_price_id)
+    ).scalar()
+    if first_price is not None:
+        starts.append(first_price)
+
+    first_news = dict(s.execute(
+        select(News.stock, func.min(News.published_at))
+        .where(News.id > last_news_id)
+        .group_by(News.stock)
+    ).all())
+    if first_news:
+        prev_last = dict(s.execute(
+            select(News.stock, func.max(News.published_at))
+            .where(News.id <= last_news_id, News.stock.in_(list(first_news)))
+            .group_by(News.stock)
+        ).all())
+        for st, first in first_news.items():
+            starts.append(pd.to_datetime(first).date())
+            if prev_last.get(st):
+                starts.append(pd.to_datetime(prev_last[st]).date() + timedelta(days=1))
+    return min(starts) if starts else None
+
+# Bulk upsert of score rows keyed on uix_risk_stock_date (COPY on PostgreSQL)
+def _upsert_scores(s, out: pd.DataFrame, chunk_size=LOAD_CHUNK_SIZE):
+    if out.empty:
+        return
+    cols = ["stock", "date", "vol_20d", "news_sent_7d", "vol_z", "sent_z", "total_score"]
+    if copy_supported(s.bind):
+        copy_merge(s, RiskScore.__table__, out[cols], keys=["stock", "date"], update=cols[2:])
+        return
+    rows = out[cols].astype(object).where(out[cols].notna(), None).to_dict("records")
+    stmt = dialect_insert(RiskScore.__table__, s.bind)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["stock", "date"],
+        set_={c: stmt.excluded[c] for c in cols[2:]},
+    )
+    for i in range(0, len(rows), chunk_size):
+        s.execute(stmt, rows[i:i + chunk_size])
+
+# Feature horizons as long (stock, date, feature, value) rows in
+# risk_features; missing values (short history) are not stored
+def _upsert_features(s, out: pd.DataFrame, features, chunk_size=LOAD_CHUNK_SIZE):
+    if out.empty or not features or not set(features) <= set(out.columns):
+        return 0
+    rows = out.melt(id_vars=["stock", "date"], value_vars=features,
+                    var_name="feature", value_name="value").dropna(subset=["value"])
+    if copy_supported(s.bind):
+        copy_merge(s, RiskFeature.__table__, rows, keys=["stock", "date", "feature"],
+                   update=["value"])
+        return len(rows)
+    stmt = dialect_insert(RiskFeature.__table__, s.bind)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["stock", "date", "feature"],
+        set_={"value": stmt.excluded.value},
+    )
+    records = rows.to_dict("records")
+    for i in range(0, len(records), chunk_size):
+        s.execute(stmt, records[i:i + chunk_size])
+    return len(rows)
+
+# Weighted features that risk_scores doesn't carry itself; streaming pass 2
+# reads them back from risk_features
+def _extra_features(weights=RISK_WEIGHTS) -> list:
+    return [f for f in weights if f not in ("vol_20d", "sent_7d")]
+
+# Features written to risk_features: every horizon with RISK_STORE_FEATURES=1,
+# otherwise only the weighted ones risk_scores doesn't carry
+def _stored_features() -> list:
+    return FEATURES if RISK_STORE_FEATURES else _extra_features()
+
+# Advance the watermarks to the ids snapshotted before this run loaded data.
+# last_dates: stock -> last scored date; news_stocks: stocks with news in the run.
+# Every row gets the new ids, not just the stocks touched by this run: the run
+# has seen every row up to them, and _affected_start takes the min across rows,
+# so a stock that stopped trading would otherwise hold the cutoff back forever.
+def _write_watermarks(s, last_dates, news_stocks, price_id, news_id):
+    s.execute(ScoreWatermark.__table__.update().values(
+        last_price_id=price_id, last_news_id=news_id))
+    stocks = set(last_dates) | set(news_stocks)
+    if not stocks:
+        return
+    rows = [{"stock": st, "last_date": last_dates.get(st),
+             "last_price_id": price_id, "last_news_id": news_id} for st in sorted(stocks)]
+    stmt = dialect_insert(ScoreWatermark.__table__, s.bind)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["stock"],
+        set_={
+            "last_date": func.coalesce(stmt.excluded.last_date, ScoreWatermark.last_date),
+            "last_price_id": stmt.excluded.last_price_id,
+            "last_news_id": stmt.excluded.last_news_id,
+        },
+    )
+    s.execute(stmt, rows)
+
+# Latest score per stock vs. its score 1/7/30 calendar days earlier (last
+# value on or before that day, i.e. the forward-filled daily series)
+def _compute_movers(scores: pd.DataFrame) -> pd.DataFrame:
+    scores = scores.assign(date=pd.to_datetime(scores["date"]).astype("datetime64[ns]"))
+    scores = scores.sort_values("date")
+    latest = scores.groupby("stock").tail(1).rename(columns={"date": "latest", "total_score": "now"})
+    movers = latest.sort_values("stock").reset_index(drop=True)
+    for days in MOVER_HORIZONS:
+        target = movers[["stock", "latest"]].assign(
+            on=(movers["latest"] - pd.Timedelta(days=days)).astype("datetime64[ns]"))
+        target = target.sort_values("on")
+        past = pd.merge_asof(target, scores, left_on="on", right_on="date",
+                             by="stock", direction="backward")
+        past = past.set_index("stock")["total_score"].reindex(movers["stock"]).to_numpy()
+        movers[f"delta_{days}d"] = movers["now"] - past
+        if days == 7:
+            movers["prev"] = past
+    movers["latest"] = movers["latest"].dt.date
+    return movers[["stock", "latest", "now", "prev", "delta_1d", "delta_7d", "delta_30d"]]
+
+# Rebuild risk_movers from the recent window of risk_scores
+def _write_movers(s):
+    latest = s.execute(select(func.max(RiskScore.date))).scalar()
+    if latest is None:
+        return
+    scores = pd.read_sql(
+        select(RiskScore.stock, RiskScore.date, RiskScore.total_score)
+        .where(RiskScore.date >= latest - timedelta(days=MOVERS_WINDOW_DAYS)),
+        s.connection(),
+    )
+    movers = _compute_movers(scores)
+    rows = movers.astype(object).where(movers.notna(), None).to_dict("records")
+    s.execute(RiskMover.__table__.delete())
+    if rows:
+        s.execute(RiskMover.__table__.insert(), rows)
+
+# --- Streaming mode ------------------------------------------------------------
+# Memory-bounded two-pass run. Pass 1 loads RISK_SHARD_SIZE tickers at a time
+# and writes their features (vol_20d, news_sent_7d) to risk_scores, and every
+# horizon to risk_features when stored or weighted. Pass 2 reads
+# back RISK_DATE_CHUNK dates at a time - the cross-section the z-scores need -
+# and fills in vol_z / sent_z / total_score. Both passes share one transaction,
+# and every per-date statistic sees exactly the rows the in-memory path sees.
+
+def _all_stocks(s) -> list:
+    return sorted(set(s.scalars(select(Price.stock).distinct()))
+                  | set(s.scalars(select(News.stock).distinct())))
+
+# Pass 1 for one shard: returns (rows written, {stock: last date}, stocks with news)
+def _write_shard_features(s, stocks, start, store=None):
+    prices, news = _load_inputs(s, start, stocks, store)
+    if prices.empty:
+        return 0, {}, set(news["stock"].dropna())
+    feats = _features(prices, news)
+    if start is not None:
+        feats = feats[feats["date"] >= start]
+    _upsert_scores(s, feats.assign(vol_z=np.nan, sent_z=np.nan, total_score=np.nan))
+    _upsert_features(s, feats, _stored_features())
+    return len(feats), feats.groupby("stock")["date"].max().to_dict(), set(news["stock"].dropna())
+
+# Pass 2: z-scores for every scored date >= start, one chunk of dates at a time
+def _write_cross_sections(s, start, date_chunk=RISK_DATE_CHUNK):
+    q = select(RiskScore.date).distinct().order_by(RiskScore.date)
+    if start is not None:
+        q = q.where(RiskScore.date >= start)
+    dates = s.scalars(q).all()
+    cols = [RiskScore.stock, RiskScore.date, RiskScore.vol_20d, RiskScore.news_sent_7d]
+    extra = _extra_features()
+    for i in range(0, len(dates), date_chunk):
+        lo, hi = dates[i], dates[i:i + date_chunk][-1]
+        chunk = pd.read_sql(select(*cols).where(RiskScore.date.between(lo, hi)), s.connection())
+        chunk["sent_7d"] = chunk["news_sent_7d"]
+        if extra:
+            feats = pd.read_sql(
+                select(RiskFeature.stock, RiskFeature.date, RiskFeature.feature, RiskFeature.value)
+                .where(RiskFeature.date.between(lo, hi), RiskFeature.feature.in_(extra)),
+                s.connection(),
+            )
+            wide = feats.pivot(index=["stock", "date"], columns="feature", values="value")
+            chunk = chunk.merge(wide.reindex(columns=extra).reset_index(),
+                                on=["stock", "date"], how="left")
+        _upsert_scores(s, _cross_section(chunk))
+
+def _write_risk_scores_streaming(s, start, shard_size=RISK_SHARD_SIZE, store=None):
+    stocks = _all_stocks(s)
+    rows, last_dates, news_stocks = 0, {}, set()
+    with metrics.stage("risk.features") as m:
+        for i in range(0, len(stocks), shard_size):
+            n, last, with_news = _write_shard_features(s, stocks[i:i + shard_size], start, store)
+            rows += n
+            last_dates.update(last)
+            news_stocks |= with_news
+        m.add(rows=rows)
+    with metrics.stage("risk.zscores") as m:
+        _write_cross_sections(s, start)
+        m.add(rows=rows)
+    return rows, last_dates, news_stocks
+
+# --- Parallel mode -------------------------------------------------------------
+# Map/reduce over a process pool. Map: each worker loads one ticker shard and
+# computes its features (independent across stocks, see _grouped_windows). Reduce:
+# the parent concatenates the shards and runs the per-date cross-section, which
+# sorts by [date, stock] first, so the output is identical to the in-process path.
+
+# Fresh connections in each worker; never reuse the parent's pooled ones
+def _init_worker():
+    engine.dispose(close=False)
+
+# Map step for one shard: (features from `start` or None, stocks with news)
+def _shard_features(stocks, start, matrix=False):
+    store = MatrixStore() if matrix else None   # reopened per worker: meta.json + memmaps
     with SessionLocal() as s:
-        for _, r in out.iterrows():
-            existing = s.execute(
-                select(RiskScore).where(RiskScore.stock == r.stock, RiskScore.date == r.date)
-            ).scalar_one_or_none()
-            if existing:
-                existing.vol_20d      = float(r.vol_20d) if pd.notnull(r.vol_20d) else None
-                existing.news_sent_7d = float(r.news_sent_7d)
-                existing.vol_z        = float(r.vol_z)
-                existing.sent_z       = float(r.sent_z)
-                existing.total_score  = float(r.total_score)
+        prices, news = _load_inputs(s, start, stocks, store)
+    news_stocks = news["stock"].dropna().unique().tolist()
+    if prices.empty:
+        return None, news_stocks
+    feats = _features(prices, news)
+    if start is not None:
+        feats = feats[feats["date"] >= start]
+    return feats, news_stocks
+
+def _score_parallel(stocks, start, workers, shard_size=RISK_SHARD_SIZE, matrix=False):
+    # At least a few shards per worker so one slow shard doesn't idle the others
+    size = max(1, min(shard_size, -(-len(stocks) // (workers * 4))))
+    shards = [stocks[i:i + size] for i in range(0, len(stocks), size)]
+    frames, news_stocks = [], set()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        for feats, with_news in pool.map(_shard_features, shards, [start] * len(shards),
+                                         [matrix] * len(shards)):
+            if feats is not None:
+                frames.append(feats)
+            news_stocks.update(with_news)
+    if not frames:
+        return pd.DataFrame(), news_stocks
+    return _cross_section(pd.concat(frames, ignore_index=True)), news_stocks
+
+# Orchestrate: load data, compute volatility + sentiment, calculate
+# risk scores, and save into DB.
+# Incremental by default: only dates touched by new prices or late news
+# (plus the lookback needed for the rolling windows) are reloaded and
+# rescored. full=True rebuilds every row. stream=True uses the memory-bounded
+# sharded path above instead of loading everything at once; workers > 1
+# computes the per-stock features on a process pool. matrix=True syncs the
+# matrix store from SQL, reads closes from it and refreshes its score series.
+def write_risk_scores(full: bool = False, method: str = RISK_METHOD, stream: bool = False,
+                      workers: int = RISK_WORKERS, matrix: bool = MATRIX_STORE):
+    if (stream or workers > 1) and method != "vectorized":
+        raise ValueError("Streaming and parallel modes use the vectorized method only")
+    if stream and workers > 1:
+        raise ValueError("Streaming mode runs in a single process; drop workers or stream")
+    Base.metadata.create_all(bind=engine)   # score_watermarks on older DBs
+
+    with SessionLocal() as s:
+        # Snapshot ids first so rows landing mid-run are picked up next time
+        price_id = s.execute(select(func.max(Price.id))).scalar() or 0
+        news_id  = s.execute(select(func.max(News.id))).scalar() or 0
+
+        start = None
+        if not full:
+            try:
+                with metrics.stage("risk.affected_start"):
+                    start = _affected_start(s)
+            except LookupError:
+                full = True    # never scored: fall back to a rebuild
             else:
-                s.add(RiskScore(
-                    stock=r.stock,
-                    date=r.date,
-                    vol_20d=float(r.vol_20d) if pd.notnull(r.vol_20d) else None,
-                    news_sent_7d=float(r.news_sent_7d),
-                    vol_z=float(r.vol_z),
-                    sent_z=float(r.sent_z),
-                    total_score=float(r.total_score),
-                ))
-        s.commit()
-    print("Risk scores updated.")
+                if start is None:
+                    print("Risk scores already up to date.")
+                    return
+
+        store = None
+        if matrix:
+            with metrics.stage("risk.matrix_sync") as m:
+                store = MatrixStore()
+                m.add(rows=sync_prices(s, store))
+
+        if stream:
+            rows, last_dates, news_stocks = _write_risk_scores_streaming(s, start, store=store)
+            with metrics.stage("risk.movers"):
+                _write_movers(s)
+            if matrix:
+                with metrics.stage("risk.matrix_sync"):
+                    sync_scores(s, start, store)
+            with metrics.stage("risk.commit"):
+                _write_watermarks(s, last_dates, news_stocks, price_id, news_id)
+                s.commit()
+            mode = "full rebuild" if full else f"incremental from {start}"
+            print(f"Risk scores updated (streaming {mode}, {rows} rows).")
+            return
+
+        if workers > 1:
+            stocks = _all_stocks(s)
+        else:
+            # 1) Pull prices & news from DB
+            with metrics.stage("risk.load") as m:
+                prices, news = _load_inputs(s, start, store=store)
+                m.add(rows=len(prices) + len(news))
+            news_stocks = news["stock"].dropna()
+
+    # 2-4) Compute features, join, z-score per day
+    with metrics.stage("risk.compute") as m:
+        if workers > 1:
+            out, news_stocks = _score_parallel(stocks, start, workers, matrix=matrix)
+        elif not prices.empty:
+            out = _score(prices, news, method)
+        else:
+            out = pd.DataFrame()
+        if start is not None and not out.empty:
+            out = out[out["date"] >= start]
+        m.add(rows=len(out))
+
+    if out.empty and full:
+        print("No prices found; run etl_prices first.")
+        return
+
+    # 5) Upsert into DB, refresh the movers table and advance watermarks
+    with SessionLocal() as s:
+        with metrics.stage("risk.upsert") as m:
+            _upsert_scores(s, out)
+            m.add(rows=len(out))
+        if _stored_features():
+            with metrics.stage("risk.features") as m:
+                m.add(rows=_upsert_features(s, out, _stored_features()))
+        with metrics.stage("risk.movers"):
+            _write_movers(s)
+        if matrix:
+            with metrics.stage("risk.matrix_sync"):
+                sync_scores(s, start, store)
+        with metrics.stage("risk.commit"):
+            last_dates = out.groupby("stock")["date"].max().to_dict() if len(out) else {}
+            _write_watermarks(s, last_dates, news_stocks, price_id, news_id)
+            s.commit()
+    mode = "full rebuild" if full else f"incremental from {start}"
+    print(f"Risk scores updated ({mode}, {len(out)} rows).")
 
 if __name__ == "__main__":
-    write_risk_scores()
+    parser = argparse.ArgumentParser(description="Compute daily risk scores.")
+    parser.add_argument("--full", action="store_true",
+                        help="rebuild every score instead of only new/affected dates")
+    parser.add_argument("--method", choices=["vectorized", "loop"], default=RISK_METHOD,
+                        help="scoring implementation (default: %(default)s)")
+    parser.add_argument("--stream", action="store_true",
+                        help="memory-bounded run over ticker shards and date chunks")
+    parser.add_argument("--workers", type=int, default=RISK_WORKERS,
+                        help="processes for the per-stock feature stage (default: %(default)s)")
+    parser.add_argument("--matrix", action=argparse.BooleanOptionalAction, default=MATRIX_STORE,
+                        help="read closes from / refresh the memory-mapped matrix store")
+    args = parser.parse_args()
+    write_risk_scores(full=args.full, method=args.method, stream=args.stream,
+                      workers=args.workers, matrix=args.matrix)
+    metrics.write("risk_engine")
@@ -1,4 +1,5 @@
 from .db import Base, engine
+from . import models  # noqa: F401  (registers tables on Base.metadata)
 
 """
 This file is the database initalizer.
@@ -0,0 +1,172 @@
+# app/sentiment.py
+import argparse, hashlib, threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import select, update
+
+from .settings import (
+    SENTIMENT_CACHE_SIZE, SENTIMENT_PERSIST, SENTIMENT_WORKERS, SENTIMENT_POOL_MIN,
+)
+from .db import SessionLocal, dialect_insert
+from .models import News, SentimentCache
+from .metrics import metrics
+
+"""
+Sentiment scoring stage (VADER compound score) for batches of headlines.
+Scores are memoized by a hash of the whitespace-normalized title, in a bounded
+in-memory LRU and optionally in the sentiment_cache table, so a syndicated
+headline is scored once no matter how many tickers or re-polls carry it.
+Large batches of cache misses are scored across a process pool.
+nltk and the VADER lexicon are only imported / loaded on the first miss, so
+importing this module (or running the ETL on cached scores) stays cheap.
+"""
+
+_analyzer = None
+
+# Load the VADER lexicon once per process (downloading it if missing)
+def _get_analyzer():
+    global _analyzer
+    if _analyzer is None:
+        import nltk
+        from nltk.sentiment import SentimentIntensityAnalyzer
+        try:
+            nltk.data.find("sentiment/vader_lexicon.zip")  # Lexicon = Dictionary
+        except LookupError:
+            nltk.download("vader_lexicon", quiet=True)
+        _analyzer = SentimentIntensityAnalyzer()
+    return _analyzer
+
+# VADER tokenizes on whitespace, so collapsing it never changes the score
+def normalize_title(title) -> str:
+    return " ".join(str(title or "").split())
+
+def title_key(title) -> str:
+    return hashlib.sha1(normalize_title(title).encode("utf-8")).hexdigest()
+
+class LRUCache:
+    """Small thread-safe LRU mapping title hash -> compound score."""
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.data:
+                return None
+            self.data.move_to_end(key)
+            return self.data[key]
+
+    def put(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+_cache = LRUCache(SENTIMENT_CACHE_SIZE)
+_table_ready = False
+
+def _score_chunk(titles):
+    sia = _get_analyzer()
+    return [sia.polarity_scores(t)["compound"] for t in titles]
+
+# Score texts in-process, or across a process pool for large batches
+def _score_texts(texts, workers):
+    if workers <= 1 or len(texts) < SENTIMENT_POOL_MIN:
+        return _score_chunk(texts)
+    size = -(-len(texts) // (workers * 4))   # ~4 chunks per worker
+    chunks = [texts[i:i + size] for i in range(0, len(texts), size)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return [v for part in pool.map(_score_chunk, chunks) for v in part]
+
+def _load_persisted(keys):
+    global _table_ready
+    found = {}
+    with SessionLocal() as s:
+        if not _table_ready:
+            SentimentCache.__table__.create(bind=s.bind, checkfirst=True)
+            _table_ready = True
+        for i in range(0, len(keys), 500):
+            found.update(s.execute(
+                select(SentimentCache.key, SentimentCache.compound)
+                .where(SentimentCache.key.in_(keys[i:i + 500]))
+            ).all())
+    return found
+
+def _store_persisted(scores):
+    rows = [{"key": k, "compound": v} for k, v in scores.items()]
+    with SessionLocal() as s:
+        s.execute(
+            dialect_insert(SentimentCache.__table__, s.bind)
+            .on_conflict_do_nothing(index_elements=["key"]),
+            rows,
+        )
+        s.commit()
+
+@metrics.timed("sentiment", rows=len)
+def score_titles(titles, persist=SENTIMENT_PERSIST, workers=SENTIMENT_WORKERS) -> list:
+    """
+    VADER compound score for each title, in input order.
+    Looks up the LRU, then (if persist) the sentiment_cache table, and only
+    scores what is still missing.
+    """
+    keys = [title_key(t) for t in titles]
+    scores, missing = {}, {}
+    for k, t in zip(keys, titles):
+        v = _cache.get(k)
+        if v is None:
+            missing.setdefault(k, normalize_title(t))
+        else:
+            scores[k] = v
+
+    if missing and persist:
+        for k, v in _load_persisted(list(missing)).items():
+            scores[k] = v
+            _cache.put(k, v)
+            del missing[k]
+
+    metrics.add("sentiment.cache_hits", rows=len(keys) - len(missing))
+    if missing:
+        with metrics.stage("sentiment.vader") as m:
+            fresh = dict(zip(missing, _score_texts(list(missing.values()), workers)))
+            m.add(rows=len(fresh))
+        for k, v in fresh.items():
+            _cache.put(k, v)
+        scores.update(fresh)
+        if persist:
+            _store_persisted(fresh)
+
+    return [scores[k] for k in keys]
+
+def rescore_news(chunk_size=20000, persist=SENTIMENT_PERSIST, workers=SENTIMENT_WORKERS):
+    """
+    Recompute news.sentiment for the whole archive, chunk by chunk (by id).
+    Returns number of rows rescored.
+    """
+    total, last_id = 0, 0
+    with SessionLocal() as s:
+        while True:
+            rows = s.execute(
+                select(News.id, News.title).where(News.id > last_id)
+                .order_by(News.id).limit(chunk_size)
+            ).all()
+            if not rows:
+                break
+            values = score_titles([t for _, t in rows], persist=persist, workers=workers)
+            s.execute(update(News), [{"id": i, "sentiment": v} for (i, _), v in zip(rows, values)])
+            s.commit()
+            total += len(rows)
+            last_id = rows[-1][0]
+    print(f"Rescored {total} news rows.")
+    return total
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rescore stored headlines with VADER.")
+    parser.add_argument("--workers", type=int, default=SENTIMENT_WORKERS)
+    parser.add_argument("--persist", action="store_true", default=SENTIMENT_PERSIST,
+                        help="read/write the sentiment_cache table")
+    args = parser.parse_args()
+    rescore_news(persist=args.persist, workers=args.workers)
+    metrics.write("sentiment")
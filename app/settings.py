@@ -14,9 +14,116 @@ load_dotenv(find_dotenv())
 ALPHA = os.environ.get("ALPHA_VINTAGE_API")
 MARKETAUX = os.environ.get("MARKETAUX_API")
 
+# API endpoints (overridable to point at a local stand-in, e.g. bench/stub_server.py)
+ALPHA_URL = os.getenv("ALPHA_URL", "https://www.alphavantage.co/query")
+MARKETAUX_URL = os.getenv("MARKETAUX_URL", "https://api.marketaux.com/v1/news/all")
+
+# API rate limits (requests per minute / per day) and concurrent fetch workers.
+# Defaults match the free tiers; raise them for a paid plan.
+ALPHA_RPM = float(os.getenv("ALPHA_RPM", "5"))
+ALPHA_RPD = int(os.getenv("ALPHA_RPD", "25"))
+MARKETAUX_RPM = float(os.getenv("MARKETAUX_RPM", "30"))
+MARKETAUX_RPD = int(os.getenv("MARKETAUX_RPD", "100"))
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", "4"))
+
+# Raw API response cache (see app/response_cache.py). Live fetches always call
+# the API and record the payload (RESPONSE_CACHE=1); --replay reads it back.
+# RESPONSE_CACHE_READ=1 makes live fetches reuse today's payload while it is
+# younger than the TTL, so nothing newer is seen until it expires.
+RESPONSE_CACHE = os.getenv("RESPONSE_CACHE", "1") == "1"
+RESPONSE_CACHE_READ = os.getenv("RESPONSE_CACHE_READ", "0") == "1"
+RESPONSE_CACHE_DIR = os.getenv("RESPONSE_CACHE_DIR", "./.cache/responses")
+RESPONSE_CACHE_TTL_HOURS = float(os.getenv("RESPONSE_CACHE_TTL_HOURS", "12"))
+RESPONSE_CACHE_MAX_MB = float(os.getenv("RESPONSE_CACHE_MAX_MB", "512"))
+
 # Database URL - defaults to SQLite file risk.db in project root
 DB_URL = os.getenv("DATABASE_URL", "sqlite:///./risk.db")
 
+# Storage profile (applied in app/db.py).
+# SQLite: WAL journal so the dashboard can read while an ETL writes, plus
+# synchronous level, page cache / mmap sizes and how long to wait on a lock.
+# PostgreSQL: connection pool size and liveness checks.
+DB_SQLITE_WAL = os.getenv("DB_SQLITE_WAL", "1") == "1"
+DB_SQLITE_SYNCHRONOUS = os.getenv("DB_SQLITE_SYNCHRONOUS", "NORMAL")
+DB_SQLITE_CACHE_MB = int(os.getenv("DB_SQLITE_CACHE_MB", "64"))
+DB_SQLITE_MMAP_MB = int(os.getenv("DB_SQLITE_MMAP_MB", "256"))
+DB_BUSY_TIMEOUT_SEC = float(os.getenv("DB_BUSY_TIMEOUT_SEC", "30"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_RECYCLE_SEC = int(os.getenv("DB_POOL_RECYCLE_SEC", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+
+# Rows per executemany batch in the bulk loaders (SQLAlchemy further pages
+# each batch into multi-row VALUES statements under the driver's limits)
+LOAD_CHUNK_SIZE = int(os.getenv("LOAD_CHUNK_SIZE", "5000"))
+
+# PostgreSQL only: load through COPY FROM STDIN + a staging table (app/bulk.py),
+# streamed in CSV chunks of COPY_CHUNK_ROWS rows
+BULK_COPY = os.getenv("BULK_COPY", "1") == "1"
+COPY_CHUNK_ROWS = int(os.getenv("COPY_CHUNK_ROWS", "100000"))
+
+# Sentiment scoring: in-memory LRU size, optional persistent cache table,
+# and process-pool workers used once a batch has at least SENTIMENT_POOL_MIN misses
+SENTIMENT_CACHE_SIZE = int(os.getenv("SENTIMENT_CACHE_SIZE", "50000"))
+SENTIMENT_PERSIST = os.getenv("SENTIMENT_PERSIST", "0") == "1"
+SENTIMENT_WORKERS = int(os.getenv("SENTIMENT_WORKERS", str(os.cpu_count() or 1)))
+SENTIMENT_POOL_MIN = int(os.getenv("SENTIMENT_POOL_MIN", "2000"))
+
+# Risk scoring implementation: "vectorized" or "loop" (original per-group loops)
+RISK_METHOD = os.getenv("RISK_METHOD", "vectorized")
+
+# Multi-horizon features: rolling windows for volatility (trading days) and news
+# sentiment (calendar days), plus the score weight of each feature's per-date
+# z-score. The defaults reproduce the original 0.6 * vol_z - 0.4 * sent_z.
+# Only the horizons risk_scores stores (vol_20d, sent_7d) and the weighted
+# ones are computed; those without a risk_scores column go to the long
+# risk_features table. RISK_STORE_FEATURES=1 computes and stores every horizon.
+RISK_VOL_WINDOWS = [int(w) for w in os.getenv("RISK_VOL_WINDOWS", "5,20,60").split(",")]
+RISK_SENT_WINDOWS = [int(w) for w in os.getenv("RISK_SENT_WINDOWS", "3,7,30").split(",")]
+RISK_WEIGHTS = {
+    name.strip(): float(weight)
+    for name, weight in (p.split("=") for p in os.getenv("RISK_WEIGHTS", "vol_20d=0.6,sent_7d=-0.4").split(","))
+}
+RISK_STORE_FEATURES = os.getenv("RISK_STORE_FEATURES", "0") == "1"
+
+# Streaming mode (write_risk_scores(stream=True)): tickers per feature shard
+# and trading dates per z-score chunk; together they bound peak memory
+RISK_SHARD_SIZE = int(os.getenv("RISK_SHARD_SIZE", "200"))
+RISK_DATE_CHUNK = int(os.getenv("RISK_DATE_CHUNK", "20"))
+
+# Processes for the parallel feature stage (write_risk_scores(workers=N)); 1 = in-process
+RISK_WORKERS = int(os.getenv("RISK_WORKERS", "1"))
+
+# Memory-mapped dates x tickers store (see app/matrix_store.py). With MATRIX_STORE=1
+# the risk engine keeps it in sync and reads closes from it, and the dashboard
+# reads score series from it instead of SQL
+MATRIX_STORE = os.getenv("MATRIX_STORE", "0") == "1"
+MATRIX_DIR = os.getenv("MATRIX_DIR", "./.cache/matrix")
+
+# Intraday mode (see app/intraday.py): TIME_SERIES_INTRADAY bar interval,
+# volatility window in bars, sentiment window in hours (default: the daily
+# engine's 7 days) and the score weights of the two per-bar z-scores
+INTRADAY_INTERVAL = os.getenv("INTRADAY_INTERVAL", "5min")
+INTRADAY_VOL_BARS = int(os.getenv("INTRADAY_VOL_BARS", "20"))
+INTRADAY_SENT_HOURS = float(os.getenv("INTRADAY_SENT_HOURS", "168"))
+INTRADAY_WEIGHTS = {
+    name.strip(): float(weight)
+    for name, weight in (p.split("=") for p in os.getenv("INTRADAY_WEIGHTS", "vol=0.6,sent=-0.4").split(","))
+}
+
+# Per-stage run metrics (see app/metrics.py): METRICS=1 turns them on;
+# JSON run reports go to METRICS_DIR, plus a Prometheus .prom file if METRICS_PROM=1
+METRICS = os.getenv("METRICS", "0") == "1"
+METRICS_DIR = os.getenv("METRICS_DIR", "./.cache/metrics")
+METRICS_PROM = os.getenv("METRICS_PROM", "0") == "1"
+
+# Seconds the dashboard reuses its data-version probe before re-checking the DB
+DASHBOARD_PROBE_SEC = int(os.getenv("DASHBOARD_PROBE_SEC", "30"))
+
+# Points per chart the dashboard sends to the browser: longer series are
+# downsampled server-side (LTTB for lines, date bins for the heatmap)
+DASHBOARD_MAX_POINTS = int(os.getenv("DASHBOARD_MAX_POINTS", "20000"))
+
 # Default stocks
 STOCKS = [
     "AAPL",  # Apple
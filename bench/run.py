@@ -0,0 +1,175 @@
+# bench/run.py
+import argparse, gc, json, os, statistics, subprocess, sys, tempfile, time, tracemalloc
+from functools import partial
+from pathlib import Path
+
+from .stub_server import StubServer
+
+"""
+Benchmark suite for the ETL loaders, the risk engine and the dashboard queries.
+
+    python -m bench.run                       # scales 10, 500, 5000 tickers
+    python -m bench.run --scales 10,500 --days 250 --json bench.json
+
+Each scale runs in a fresh interpreter against its own SQLite file, with the
+Alpha Vantage / Marketaux calls served by bench/stub_server.py (rate limits
+lifted, response cache off). Every stage reports wall time, throughput and
+peak traced memory (tracemalloc; pass --no-memory for cleaner timings).
+"""
+
+ROOT = Path(__file__).resolve().parents[1]
+MARKER = "BENCH_RESULT "
+
+# --- worker side (runs inside the per-scale subprocess) -----------------------
+
+class Recorder:
+    def __init__(self, memory=True):
+        self.memory = memory
+        self.results = []
+
+    def stage(self, name, fn, rows=None, items=None):
+        """Run fn once; rows = rows processed (or callable on fn's result), items = requests/queries."""
+        gc.collect()
+        if self.memory:
+            tracemalloc.start()
+        t0 = time.perf_counter()
+        out = fn()
+        secs = time.perf_counter() - t0
+        peak = tracemalloc.get_traced_memory()[1] if self.memory else 0
+        if self.memory:
+            tracemalloc.stop()
+        n = rows(out) if callable(rows) else rows
+        self.results.append({
+            "stage": name,
+            "seconds": round(secs, 4),
+            "rows": n,
+            "rows_per_s": round(n / secs, 1) if n and secs else None,
+            "ms_per_item": round(1000 * secs / items, 3) if items else None,
+            "peak_mb": round(peak / 2**20, 1) if self.memory else None,
+        })
+        return out
+
+    def latency(self, name, fn, repeats):
+        """Median latency of fn over `repeats` calls."""
+        times = []
+        for i in range(repeats):
+            t0 = time.perf_counter()
+            fn(i)
+            times.append(time.perf_counter() - t0)
+        self.results.append({"stage": name, "seconds": round(sum(times), 4), "rows": None,
+                             "rows_per_s": None,
+                             "ms_per_item": round(1000 * statistics.median(times), 3),
+                             "peak_mb": None})
+
+def run_worker(scale, days, memory):
+    from app.seed import init_db
+    from app.etl_prices import fetch_prices_daily, load_prices_bulk
+    from app.etl_news import fetch_news, load_news_batch
+    from app.fetcher import fetch_many
+    from app.risk_engine import write_risk_scores
+    from app.sentiment import score_titles
+    from ui import data as ui_data
+    from .synth import tickers, synth_prices, synth_news
+
+    init_db()
+    rec = Recorder(memory)
+    names = tickers(scale)
+
+    # Extract: concurrent HTTP fetch + parse against the stub
+    rec.stage("fetch_prices", lambda: [df for _, df in fetch_many(fetch_prices_daily, names)],
+              rows=lambda frames: sum(len(f) for f in frames), items=scale)
+    rec.stage("fetch_news", lambda: [df for _, df in fetch_many(partial(fetch_news, limit=20), names)],
+              rows=lambda frames: sum(len(f) for f in frames), items=scale)
+
+    # Load: full synthetic history (N tickers x M days)
+    prices = synth_prices(scale, days)
+    last_day = prices["date"].max()
+    history = prices[prices["date"] < last_day]
+    rec.stage("load_prices", lambda: load_prices_bulk(history), rows=len(history))
+
+    news = synth_news(scale, days)
+    news["sentiment"] = score_titles(news["title"].tolist())
+    news["raw"] = None
+    rec.stage("load_news", lambda: load_news_batch(news), rows=len(news))
+    rec.stage("reload_news_unchanged", lambda: load_news_batch(news), rows=len(news))
+
+    # Risk engine: full rebuild, then a one-day incremental run
+    rec.stage("risk_full", lambda: write_risk_scores(full=True), rows=len(history))
+    rec.stage("risk_full_stream", lambda: write_risk_scores(full=True, stream=True),
+              rows=len(history))
+    newest = prices[prices["date"] == last_day]
+    load_prices_bulk(newest)
+    rec.stage("risk_incremental_1d", lambda: write_risk_scores(), rows=len(newest))
+
+    # Dashboard queries (cache cleared so every call hits the DB)
+    version = ui_data.data_version()
+    def series(i):
+        ui_data.load_risk.clear()
+        ui_data.load_risk(names[i % scale], version, 120)
+    def movers(i):
+        ui_data.load_movers.clear()
+        ui_data.load_movers(version)
+    def panel(i):
+        ui_data.load_panel.clear()
+        wide = ui_data.load_panel(tuple(names), version, 365)
+        ui_data.downsample_panel(wide)
+        ui_data.bin_panel(wide)
+    rec.latency("dashboard_risk_series", series, repeats=20)
+    rec.latency("dashboard_movers", movers, repeats=20)
+    rec.latency("dashboard_panel", panel, repeats=5)
+
+    print(MARKER + json.dumps({"scale": scale, "days": days, "stages": rec.results}))
+
+# --- driver side ---------------------------------------------------------------
+
+def run_scale(scale, days, memory, base_url):
+    with tempfile.TemporaryDirectory(prefix=f"bench_{scale}_") as tmp:
+        env = dict(os.environ,
+                   DATABASE_URL=f"sqlite:///{tmp}/bench.db",
+                   ALPHA_URL=f"{base_url}/query",
+                   MARKETAUX_URL=f"{base_url}/v1/news/all",
+                   ALPHA_VINTAGE_API="bench", MARKETAUX_API="bench",
+                   ALPHA_RPM="1000000", ALPHA_RPD="100000000",
+                   MARKETAUX_RPM="1000000", MARKETAUX_RPD="100000000",
+                   RESPONSE_CACHE="0", PYTHONPATH=str(ROOT))
+        cmd = [sys.executable, "-m", "bench.run", "--worker", "--scale", str(scale),
+               "--days", str(days)] + ([] if memory else ["--no-memory"])
+        out = subprocess.run(cmd, cwd=tmp, env=env, check=True,
+                             stdout=subprocess.PIPE, text=True).stdout
+    line = next(l for l in out.splitlines() if l.startswith(MARKER))
+    return json.loads(line[len(MARKER):])
+
+def print_report(results):
+    header = f"{'scale':>6} {'stage':<24} {'seconds':>9} {'rows':>10} {'rows/s':>12} {'ms/item':>9} {'peak MB':>8}"
+    print(header)
+    print("-" * len(header))
+    # Right-aligned in `width` columns; missing values print as a padded "-"
+    fmt = lambda v, width, spec="": f"{v:>{width}{spec}}" if v is not None else f"{'-':>{width}}"
+    for r in results:
+        for st in r["stages"]:
+            print(f"{r['scale']:>6} {st['stage']:<24} {st['seconds']:>9.3f} "
+                  f"{fmt(st['rows'], 10)} {fmt(st['rows_per_s'], 12, ',.0f')} "
+                  f"{fmt(st['ms_per_item'], 9, '.3f')} {fmt(st['peak_mb'], 8, '.1f')}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ETL, risk engine and dashboard queries.")
+    parser.add_argument("--scales", default="10,500,5000",
+                        help="comma-separated ticker counts (default: %(default)s)")
+    parser.add_argument("--days", type=int, default=250, help="business days of history")
+    parser.add_argument("--json", help="also write results to this file")
+    parser.add_argument("--no-memory", dest="memory", action="store_false",
+                        help="skip tracemalloc (lower overhead, no peak memory)")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--scale", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.scale, args.days, args.memory)
+    else:
+        results = []
+        with StubServer(days=args.days) as stub:
+            for scale in [int(s) for s in args.scales.split(",")]:
+                results.append(run_scale(scale, args.days, args.memory, stub.base_url))
+        print_report(results)
+        if args.json:
+            Path(args.json).write_text(json.dumps(results, indent=2))
@@ -0,0 +1,109 @@
+# bench/startup.py
+import argparse, json, os, statistics, subprocess, sys, tempfile, time
+from pathlib import Path
+
+"""
+Cold-start benchmark for the entry points and the dashboard.
+
+    python -m bench.startup                    # every python -m app.* module + first dashboard paint
+    python -m bench.startup --repeats 10 --max-ms 1500 --json startup.json
+
+Every sample runs in a fresh interpreter (nothing cached in sys.modules).
+For each module it reports the import time measured inside the process and
+the whole process wall time, and checks that the lazily loaded dependencies
+(nltk, requests, the unused SQL dialect) are not pulled in by the import.
+The dashboard is run headless through streamlit's AppTest: the first run is
+the first paint of a new server process, the second a widget rerun.
+Exits non-zero if a laziness check fails or a median exceeds --max-ms.
+"""
+
+ROOT = Path(__file__).resolve().parents[1]
+MARKER = "STARTUP_RESULT "
+
+ENTRY_POINTS = [
+    "app.seed", "app.migrate", "app.etl_prices", "app.etl_news", "app.sentiment",
+    "app.risk_engine", "app.matrix_store", "app.intraday", "app.jobs",
+]
+
+# Modules an import must not load: they are deferred to first use
+LAZY = ["nltk", "requests", "sqlalchemy.dialects.postgresql"]
+
+IMPORT_SNIPPET = """
+import sys, time, json
+t0 = time.perf_counter()
+import {module}
+secs = time.perf_counter() - t0
+print({marker!r} + json.dumps({{"seconds": secs, "loaded": [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+DASHBOARD_SNIPPET = """
+import time, json
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({path!r}, default_timeout=120)
+t0 = time.perf_counter(); at.run(); first = time.perf_counter() - t0
+t0 = time.perf_counter(); at.run(); rerun = time.perf_counter() - t0
+print({marker!r} + json.dumps({{"seconds": first, "rerun": rerun, "loaded": []}}))
+"""
+
+def _sample(code, env):
+    t0 = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, check=True,
+                         stdout=subprocess.PIPE, text=True).stdout
+    wall = time.perf_counter() - t0
+    line = next(l for l in out.splitlines() if l.startswith(MARKER))
+    return {**json.loads(line[len(MARKER):]), "wall": wall}
+
+def measure(name, code, env, repeats):
+    samples = [_sample(code, env) for _ in range(repeats)]
+    ms = lambda key: round(1000 * statistics.median(s[key] for s in samples), 1)
+    result = {
+        "entry": name,
+        "import_ms": ms("seconds"),
+        "min_ms": round(1000 * min(s["seconds"] for s in samples), 1),
+        "process_ms": ms("wall"),
+        "loaded": sorted({m for s in samples for m in s["loaded"]}),
+    }
+    if "rerun" in samples[0]:
+        result["rerun_ms"] = ms("rerun")
+    return result
+
+def print_report(results):
+    header = f"{'entry':<16} {'import ms':>10} {'min ms':>8} {'process ms':>11} {'rerun ms':>9}  eager"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        rerun = f"{r['rerun_ms']:>9.1f}" if "rerun_ms" in r else f"{'-':>9}"
+        print(f"{r['entry']:<16} {r['import_ms']:>10.1f} {r['min_ms']:>8.1f} "
+              f"{r['process_ms']:>11.1f} {rerun}  {', '.join(r['loaded']) or '-'}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark cold start of the entry points and dashboard.")
+    parser.add_argument("--repeats", type=int, default=5, help="fresh processes per entry point")
+    parser.add_argument("--modules", default=",".join(ENTRY_POINTS),
+                        help="comma-separated modules to import (default: all entry points)")
+    parser.add_argument("--no-dashboard", dest="dashboard", action="store_false",
+                        help="skip the dashboard first-paint measurement")
+    parser.add_argument("--max-ms", type=float,
+                        help="fail if any median import / first paint takes longer")
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_startup_") as tmp:
+        # A throwaway SQLite file unless DATABASE_URL points somewhere already
+        env = dict(os.environ, PYTHONPATH=str(ROOT))
+        env.setdefault("DATABASE_URL", f"sqlite:///{tmp}/startup.db")
+        results = []
+        for module in args.modules.split(","):
+            code = IMPORT_SNIPPET.format(module=module, marker=MARKER, lazy=LAZY)
+            results.append(measure(module, code, env, args.repeats))
+        if args.dashboard:
+            code = DASHBOARD_SNIPPET.format(path=str(ROOT / "ui" / "Dashboard.py"), marker=MARKER)
+            results.append(measure("ui.Dashboard", code, env, args.repeats))
+
+    print_report(results)
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+    failed = [r["entry"] for r in results
+              if r["loaded"] or (args.max_ms and r["import_ms"] > args.max_ms)]
+    if failed:
+        sys.exit(f"Startup checks failed: {', '.join(failed)}")
@@ -0,0 +1,75 @@
+# bench/stub_server.py
+import argparse, json, threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from .synth import av_daily_payload, marketaux_payload
+
+"""
+Local HTTP stand-in for the two APIs the ETLs call:
+    GET /query?function=TIME_SERIES_DAILY&symbol=...&outputsize=compact|full
+    GET /v1/news/all?symbols=...&limit=...
+Payloads come from bench/synth.py, so they are deterministic per ticker.
+Point the app at it with ALPHA_URL=http://host:port/query and
+MARKETAUX_URL=http://host:port/v1/news/all.
+"""
+
+class _Handler(BaseHTTPRequestHandler):
+    days = 250
+    news_per_day = 0.2
+    protocol_version = "HTTP/1.1"   # keep-alive, like the real APIs
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if url.path == "/query" and q.get("function") == "TIME_SERIES_DAILY":
+            days = self.days if q.get("outputsize") == "full" else min(self.days, 100)
+            body = av_daily_payload(q.get("symbol", "X"), days)
+        elif url.path == "/v1/news/all":
+            body = marketaux_payload(q.get("symbols", "X"), self.days, self.news_per_day,
+                                     int(q.get("limit", 20)))
+        else:
+            self.send_error(404)
+            return
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+class StubServer:
+    """Runs the stub on a background thread; use as a context manager."""
+    def __init__(self, host="127.0.0.1", port=0, days=250, news_per_day=0.2):
+        handler = type("Handler", (_Handler,), {"days": days, "news_per_day": news_per_day})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve fake Alpha Vantage / Marketaux responses.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--days", type=int, default=250)
+    args = parser.parse_args()
+    with StubServer(port=args.port, days=args.days) as srv:
+        print(f"Serving on {srv.base_url} (Ctrl-C to stop)")
+        try:
+            srv.thread.join()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,89 @@
+# bench/synth.py
+import zlib
+from datetime import date
+import numpy as np
+import pandas as pd
+
+"""
+Synthetic data for the benchmarks.
+Prices are geometric random walks (OHLCV) on a business-day calendar; news is
+a stream of timestamped headlines built from a small vocabulary so VADER has
+something to score. Everything is deterministic per ticker (seeded by name),
+so the stub server and the direct generators produce identical data.
+"""
+
+START = date(2020, 1, 1)
+
+WORDS = ["beats", "misses", "record", "surge", "plunge", "upgrade", "downgrade",
+         "lawsuit", "strong", "weak", "growth", "loss", "profit", "guidance", "outlook"]
+
+def tickers(n: int) -> list:
+    return [f"T{i:05d}" for i in range(n)]
+
+def _rng(stock: str, salt: int = 0):
+    return np.random.default_rng(zlib.crc32(stock.encode()) + salt)
+
+def synth_prices_one(stock: str, n_days: int) -> pd.DataFrame:
+    rng = _rng(stock)
+    days = pd.bdate_range(START, periods=n_days)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n_days)))
+    spread = np.abs(rng.normal(0, 0.01, n_days)) * close
+    return pd.DataFrame({
+        "stock": stock,
+        "date": days.date,
+        "open": close + rng.normal(0, 0.005, n_days) * close,
+        "high": close + spread,
+        "low": close - spread,
+        "close": close,
+        "volume": rng.integers(1e5, 1e7, n_days).astype(float),
+    })
+
+def synth_prices(n_tickers: int, n_days: int) -> pd.DataFrame:
+    """N tickers x M business days of random-walk OHLCV."""
+    return pd.concat([synth_prices_one(t, n_days) for t in tickers(n_tickers)], ignore_index=True)
+
+def synth_news_one(stock: str, n_days: int, per_day: float) -> pd.DataFrame:
+    rng = _rng(stock, salt=1)
+    n = max(1, int(n_days * per_day))
+    hours = np.sort(rng.integers(0, int(n_days * 7 / 5) * 24, n))
+    published = pd.Timestamp(START) + pd.to_timedelta(hours, unit="h")
+    words = rng.choice(WORDS, size=(n, 3))
+    titles = [f"{stock} {' '.join(w)} ({i})" for i, w in enumerate(words)]
+    return pd.DataFrame({
+        "stock": stock,
+        "published_at": published.strftime("%Y-%m-%dT%H:%M:%S.000000Z"),
+        "title": titles,
+        "url": [f"https://example.com/{stock}/{i}" for i in range(n)],
+        "source": "synthetic",
+    })
+
+def synth_news(n_tickers: int, n_days: int, per_day: float = 0.2) -> pd.DataFrame:
+    """Headlines with timestamps, ~per_day articles per ticker per business day."""
+    return pd.concat([synth_news_one(t, n_days, per_day) for t in tickers(n_tickers)],
+                     ignore_index=True)
+
+# --- API-shaped payloads (what the stub server returns) ----------------------
+
+def av_daily_payload(stock: str, n_days: int) -> dict:
+    """Alpha Vantage TIME_SERIES_DAILY response body, newest date first."""
+    df = synth_prices_one(stock, n_days).iloc[::-1]
+    series = {
+        d.isoformat(): {"1. open": f"{o:.4f}", "2. high": f"{h:.4f}", "3. low": f"{l:.4f}",
+                        "4. close": f"{c:.4f}", "5. volume": f"{int(v)}"}
+        for d, o, h, l, c, v in df[["date", "open", "high", "low", "close", "volume"]]
+        .itertuples(index=False, name=None)
+    }
+    return {
+        "Meta Data": {"1. Information": "Daily Prices (open, high, low, close) and Volumes",
+                      "2. Symbol": stock},
+        "Time Series (Daily)": series,
+    }
+
+def marketaux_payload(stock: str, n_days: int, per_day: float, limit: int) -> dict:
+    """Marketaux /v1/news/all response body with the latest `limit` articles."""
+    df = synth_news_one(stock, n_days, per_day).iloc[::-1].head(limit)
+    data = [{"uuid": f"{stock}-{i}", "title": r.title, "url": r.url, "source": r.source,
+             "published_at": r.published_at, "entities": [{"symbol": stock}]}
+            for i, r in enumerate(df.itertuples(index=False))]
+    return {"meta": {"found": len(data), "returned": len(data), "limit": limit, "page": 1},
+            "data": data}
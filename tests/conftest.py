@@ -0,0 +1,20 @@
+# tests/conftest.py
+import os, tempfile
+
+import pytest
+
+# app.settings reads DATABASE_URL at import time, so point it at a throwaway
+# SQLite file before any test module imports the app
+_tmp = tempfile.mkdtemp(prefix="risk_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/test.db"
+os.environ["MATRIX_STORE"] = "0"
+
+# Fresh, empty schema for a test that writes to the database
+@pytest.fixture
+def db():
+    import app.models  # noqa: F401  (registers the tables on Base)
+    from app.db import Base, engine
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
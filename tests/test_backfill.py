@@ -0,0 +1,64 @@
+# tests/test_backfill.py
+import threading
+
+import pytest
+from sqlalchemy import select
+
+from app import fetcher
+from app.db import SessionLocal
+from app.etl_prices import backfill
+from app.models import BackfillCheckpoint
+
+"""
+Backfill against a spent Alpha Vantage quota: the run stops instead of
+marking every remaining ticker failed, and a rerun resumes.
+"""
+
+STOCKS = [f"T{i}" for i in range(10)]
+SPENT = {"Information": "Thank you for using Alpha Vantage! Our standard API rate limit "
+                        "is 25 requests per day."}
+DAILY = {"Time Series (Daily)": {
+    "2024-01-02": {"1. open": "1", "2. high": "1", "3. low": "1", "4. close": "1",
+                   "5. volume": "100"},
+}}
+
+class _Response:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+@pytest.fixture
+def api(monkeypatch):
+    """Fake Alpha Vantage; set api.payload to what it answers."""
+    class Api:
+        payload = SPENT
+        calls = 0
+    lock = threading.Lock()
+    def get(url, params, provider):
+        fetcher.PROVIDERS[provider]["limiter"].acquire()
+        with lock:
+            Api.calls += 1
+        return _Response(Api.payload)
+    monkeypatch.setattr(fetcher, "get_with_backoff", get)
+    monkeypatch.setattr(fetcher, "RESPONSE_CACHE", False)
+    monkeypatch.setitem(fetcher.PROVIDERS["alphavantage"], "limiter",
+                        fetcher.RateLimiter(6000, burst=100))
+    return Api
+
+def _checkpoints():
+    with SessionLocal() as s:
+        return dict(s.execute(select(BackfillCheckpoint.stock, BackfillCheckpoint.status)).all())
+
+def test_spent_quota_stops_and_resumes(db, api, monkeypatch):
+    assert backfill(STOCKS) == 0
+    assert api.calls < len(STOCKS)           # only the fetches already in flight
+    assert "failed" not in _checkpoints().values()
+
+    # Next day: a fresh budget, and the rerun picks up every ticker
+    monkeypatch.setitem(fetcher.PROVIDERS["alphavantage"], "limiter",
+                        fetcher.RateLimiter(6000, burst=100))
+    api.payload = DAILY
+    assert backfill(STOCKS) == len(STOCKS)
+    assert set(_checkpoints().values()) == {"done"}
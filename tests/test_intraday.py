@@ -0,0 +1,48 @@
+# tests/test_intraday.py
+import pytest
+
+from app import fetcher
+from app.intraday import fetch_intraday
+
+"""
+Intraday bars are always fetched live; the response cache only serves --replay.
+"""
+
+BARS = {"Time Series (5min)": {
+    "2024-01-02 10:00:00": {"1. open": "1", "2. high": "1", "3. low": "1", "4. close": "1",
+                            "5. volume": "100"},
+}}
+
+class _Response:
+    def json(self):
+        return BARS
+
+# A response cache that has a fresh entry for every request
+class _WarmCache:
+    def get(self, url, params):
+        return BARS
+
+    def latest(self, url, params):
+        return BARS
+
+    def put(self, url, params, payload):
+        pass
+
+@pytest.fixture
+def http(monkeypatch):
+    calls = []
+    def get(url, params, provider):
+        calls.append(params["symbol"])
+        return _Response()
+    monkeypatch.setattr(fetcher, "get_with_backoff", get)
+    monkeypatch.setattr(fetcher, "response_cache", _WarmCache())
+    monkeypatch.setattr(fetcher, "RESPONSE_CACHE_READ", True)
+    return calls
+
+def test_live_fetch_skips_cache(http):
+    assert len(fetch_intraday("AAA", interval="5min")) == 1
+    assert http == ["AAA"]
+
+def test_replay_reads_cache(http):
+    assert len(fetch_intraday("AAA", interval="5min", replay=True)) == 1
+    assert http == []
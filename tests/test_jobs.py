@@ -0,0 +1,55 @@
+# tests/test_jobs.py
+import pytest
+
+from app import fetcher
+from app.jobs import RefreshJob, run_pipeline
+
+"""
+Dashboard refresh job: a forced refresh reaches the APIs even when today's
+payloads are in the response cache.
+"""
+
+DAILY = {"Time Series (Daily)": {
+    "2024-01-02": {"1. open": "1", "2. high": "1", "3. low": "1", "4. close": "1",
+                   "5. volume": "100"},
+}}
+PAYLOADS = {"alphavantage": DAILY, "marketaux": {"data": []}}
+
+class _Response:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+# A response cache that has a fresh entry for every request
+class _WarmCache:
+    def get(self, url, params):
+        return PAYLOADS["marketaux" if "symbols" in params else "alphavantage"]
+
+    def put(self, url, params, payload):
+        pass
+
+@pytest.fixture
+def http(monkeypatch):
+    calls = []
+    def get(url, params, provider):
+        calls.append(provider)
+        return _Response(PAYLOADS[provider])
+    monkeypatch.setattr(fetcher, "get_with_backoff", get)
+    monkeypatch.setattr(fetcher, "response_cache", _WarmCache())
+    monkeypatch.setattr(fetcher, "RESPONSE_CACHE_READ", True)
+    return calls
+
+def test_cached_refresh_skips_http(db, http):
+    job = RefreshJob(["AAA"])
+    run_pipeline(job)
+    assert job.status == "done", job.error
+    assert http == []
+
+def test_forced_refresh_fetches_fresh(db, http):
+    job = RefreshJob(["AAA"], force=True)
+    run_pipeline(job)
+    assert job.status == "done", job.error
+    assert sorted(http) == ["alphavantage", "marketaux"]
+    assert job.inserted["prices"] == 1
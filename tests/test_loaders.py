@@ -0,0 +1,50 @@
+# tests/test_loaders.py
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from app.etl_news import load_news_batch
+from app.etl_prices import load_prices_bulk
+
+"""
+The batch loaders keep the per-row loaders' contract: they return the number
+of rows actually inserted, whatever the duplicates or chunking.
+"""
+
+def _prices(stocks=("AAA", "BBB"), days=10):
+    dates = pd.bdate_range(date(2024, 1, 1), periods=days).date
+    return pd.DataFrame([
+        {"stock": st, "date": d, "open": 1.0, "high": 1.0, "low": 1.0, "close": 1.0 + i,
+         "volume": 1e6}
+        for st in stocks for i, d in enumerate(dates)
+    ])
+
+def _news(stocks=("AAA", "BBB"), n=10):
+    return pd.DataFrame([
+        {"stock": st, "published_at": f"2024-01-{i + 1:02d}T10:00:00.000000Z",
+         "title": f"{st} headline {i}", "url": f"https://example.com/{st}/{i}",
+         "source": "test", "sentiment": 0.1,
+         "raw": {"url": f"https://example.com/{st}/{i}", "entities": [{"symbol": st}]}}
+        for st in stocks for i in range(n)
+    ])
+
+LOADERS = [(load_prices_bulk, _prices), (load_news_batch, _news)]
+IDS = ["prices", "news"]
+
+@pytest.mark.parametrize("load, make", LOADERS, ids=IDS)
+def test_in_batch_duplicates_count_once(db, load, make):
+    df = make()
+    assert load(pd.concat([df, df.iloc[:5]], ignore_index=True)) == len(df)
+
+@pytest.mark.parametrize("load, make", LOADERS, ids=IDS)
+def test_rerun_inserts_nothing(db, load, make):
+    df = make()
+    assert load(df) == len(df)
+    assert load(df) == 0
+
+@pytest.mark.parametrize("load, make", LOADERS, ids=IDS)
+def test_chunks_smaller_than_batch(db, load, make):
+    df = make()
+    assert load(df.iloc[:7], chunk_size=3) == 7
+    assert load(df, chunk_size=3) == len(df) - 7
@@ -0,0 +1,107 @@
+# tests/test_migrate.py
+from functools import partial
+
+import pandas as pd
+import pytest
+from sqlalchemy import (
+    JSON, Column, Date, Float, Integer, MetaData, String, Table, Text, UniqueConstraint,
+    func, inspect, select,
+)
+
+from app import migrate
+from app.db import Base, SessionLocal, engine
+from app.models import NewsPayload
+from app.news_archive import archive, load_payload
+
+"""
+Migration of an original-schema database, where news carries the article
+JSON inline in a `raw` column, into the news_payloads archive (0004), and
+the archive's merge of one story's copies across tickers.
+"""
+
+# The tables as the first release created them
+baseline = MetaData()
+Table("prices", baseline,
+      Column("id", Integer, primary_key=True), Column("stock", String, index=True),
+      Column("date", Date, index=True), Column("open", Float), Column("high", Float),
+      Column("low", Float), Column("close", Float), Column("volume", Float),
+      UniqueConstraint("stock", "date", name="uix_price_stock_date"))
+news = Table("news", baseline,
+      Column("id", Integer, primary_key=True), Column("stock", String, index=True),
+      Column("published_at", String, index=True), Column("title", Text), Column("url", Text),
+      Column("source", String), Column("sentiment", Float), Column("raw", JSON),
+      UniqueConstraint("stock", "published_at", "title", name="uix_news_unique"))
+Table("risk_scores", baseline,
+      Column("id", Integer, primary_key=True), Column("stock", String, index=True),
+      Column("date", Date, index=True), Column("vol_20d", Float),
+      Column("news_sent_7d", Float), Column("vol_z", Float), Column("sent_z", Float),
+      Column("total_score", Float),
+      UniqueConstraint("stock", "date", name="uix_risk_stock_date"))
+
+def _article(url, *symbols):
+    return {"url": url, "title": "Shared story", "description": "x" * 200,
+            "entities": [{"symbol": s, "match_score": 1.0} for s in symbols]}
+
+# (stock, url, raw): one story carried by three tickers, each copy listing its
+# own symbol (the B copy also repeats A), plus a single-ticker story
+ROWS = [
+    ("A", "https://example.com/shared", _article("https://example.com/shared", "A")),
+    ("B", "https://example.com/shared", _article("https://example.com/shared", "B", "A")),
+    ("A", "https://example.com/solo", _article("https://example.com/solo", "A")),
+    ("C", "https://example.com/shared", _article("https://example.com/shared", "C")),
+]
+
+@pytest.fixture
+def old_db(monkeypatch):
+    Base.metadata.drop_all(bind=engine)
+    migrate.schema_migrations.drop(bind=engine, checkfirst=True)
+    baseline.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(news.insert(), [
+            {"stock": st, "published_at": f"2024-01-0{i + 1}T10:00:00Z", "title": f"t{i}",
+             "url": url, "source": "test", "sentiment": 0.0, "raw": raw}
+            for i, (st, url, raw) in enumerate(ROWS)
+        ])
+    # Chunks of two rows, so copies of the shared story land in different chunks
+    steps = [(name, partial(migrate._archive_news_raw, chunk_rows=2)
+              if name == "0004_news_payload_archive" else step)
+             for name, step in migrate.MIGRATIONS]
+    monkeypatch.setattr(migrate, "MIGRATIONS", steps)
+    yield
+    engine.dispose()
+
+def _payload_rows():
+    with engine.connect() as conn:
+        return conn.execute(select(NewsPayload.url, NewsPayload.payload)
+                            .order_by(NewsPayload.url)).all()
+
+def test_archive_migration(old_db):
+    assert "0004_news_payload_archive" in migrate.migrate(analyze=False)
+
+    shared = load_payload("https://example.com/shared")
+    assert [e["symbol"] for e in shared["entities"]] == ["A", "B", "C"]
+    assert shared["description"] == "x" * 200
+    solo = load_payload("https://example.com/solo")
+    assert [e["symbol"] for e in solo["entities"]] == ["A"]
+    assert len(_payload_rows()) == 2
+
+    columns = {c["name"] for c in inspect(engine).get_columns("news")}
+    assert "raw" not in columns
+    with engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(news)).scalar() == len(ROWS)
+
+def test_migrations_rerun_is_noop(old_db):
+    migrate.migrate(analyze=False)
+    before = _payload_rows()
+    assert migrate.migrate(analyze=False) == []
+    assert _payload_rows() == before
+
+def test_archive_merges_copies_by_symbol(db):
+    df = pd.DataFrame([{"url": url, "raw": raw} for _, url, raw in ROWS])
+    with SessionLocal() as s:
+        assert archive(s, df.iloc[:2]) == 1
+        assert archive(s, df.iloc[2:]) == 2      # solo is new, shared gains C
+        assert archive(s, df) == 0               # nothing new to merge
+        s.commit()
+    shared = load_payload("https://example.com/shared")
+    assert [e["symbol"] for e in shared["entities"]] == ["A", "B", "C"]
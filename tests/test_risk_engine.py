@@ -0,0 +1,113 @@
+# tests/test_risk_engine.py
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from app import risk_engine
+from app.db import SessionLocal
+from app.etl_prices import load_prices_bulk
+from app.etl_news import load_news_batch
+from app.models import RiskScore
+
+"""
+Loop vs vectorized scoring parity, and incremental vs full rebuild
+equivalence on a scratch SQLite database.
+"""
+
+COLS = ["stock", "date", "vol_20d", "news_sent_7d", "vol_z", "sent_z", "total_score"]
+
+def _prices(stocks, days, start=date(2024, 1, 1), seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start, periods=days).date
+    frames = []
+    for stock in stocks:
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, days)))
+        frames.append(pd.DataFrame({"stock": stock, "date": dates, "open": close,
+                                    "high": close, "low": close, "close": close,
+                                    "volume": 1e6}))
+    return pd.concat(frames, ignore_index=True)
+
+def _news(stocks, n, start=date(2024, 1, 1), span_days=120, seed=1, utc=True):
+    rng = np.random.default_rng(seed)
+    hours = rng.integers(0, span_days * 24, n)
+    fmt = "%Y-%m-%dT%H:%M:%S.000000Z" if utc else "%Y-%m-%d %H:%M:%S"
+    ts = [(pd.Timestamp(start) + pd.Timedelta(hours=int(h))).strftime(fmt) for h in hours]
+    return pd.DataFrame({
+        "stock": rng.choice(stocks, n),
+        "published_at": ts,
+        "sentiment": rng.uniform(-1, 1, n),
+    })
+
+def _assert_parity(prices, news):
+    loop = risk_engine._score(prices, news, method="loop")
+    vec = risk_engine._score(prices, news, method="vectorized")
+    order = lambda df: (df[COLS].sort_values(["date", "stock"], kind="stable")
+                                .reset_index(drop=True))
+    assert_frame_equal(order(vec), order(loop), check_dtype=False, rtol=1e-9)
+
+def test_parity_basic():
+    stocks = ["AAA", "BBB", "CCC", "DDD"]
+    _assert_parity(_prices(stocks, 90), _news(stocks, 300))
+
+def test_parity_single_price_row():
+    prices = pd.concat([_prices(["AAA", "BBB"], 60), _prices(["ONE"], 1, seed=3)],
+                       ignore_index=True)
+    _assert_parity(prices, _news(["AAA", "BBB", "ONE"], 120))
+
+def test_parity_stock_without_news():
+    _assert_parity(_prices(["AAA", "BBB", "QUIET"], 60), _news(["AAA", "BBB"], 120))
+
+def test_parity_news_without_prices():
+    _assert_parity(_prices(["AAA", "BBB"], 60), _news(["AAA", "BBB", "GHOST"], 150))
+
+@pytest.mark.parametrize("utc", [True, False], ids=["z-suffixed", "naive"])
+def test_parity_published_at_formats(utc):
+    stocks = ["AAA", "BBB", "CCC"]
+    _assert_parity(_prices(stocks, 60), _news(stocks, 150, utc=utc))
+
+def test_parity_empty_news():
+    news = pd.DataFrame({"stock": pd.Series(dtype=object),
+                         "published_at": pd.Series(dtype=object),
+                         "sentiment": pd.Series(dtype=float)})
+    _assert_parity(_prices(["AAA", "BBB", "CCC"], 60), news)
+
+def _stored_scores():
+    with SessionLocal() as s:
+        df = pd.read_sql(RiskScore.__table__.select(), s.connection())
+    return df[COLS].sort_values(["stock", "date"]).reset_index(drop=True)
+
+def test_incremental_matches_full(db):
+    stocks = [f"T{i}" for i in range(8)]
+    prices = _prices(stocks, 120)
+    news = _news(stocks, 600).sort_values("published_at", kind="stable")
+    news = news.assign(title=[f"headline {i}" for i in range(len(news))],
+                       url=[f"https://example.com/{i}" for i in range(len(news))],
+                       source="test")
+    cut = prices["date"].max() - timedelta(days=10)
+    news_cut = int(len(news) * 0.9)
+
+    load_prices_bulk(prices[prices["date"] <= cut])
+    load_news_batch(news.iloc[:news_cut])
+    risk_engine.write_risk_scores(matrix=False)
+    load_prices_bulk(prices[prices["date"] > cut])
+    load_news_batch(news.iloc[news_cut:])
+    risk_engine.write_risk_scores(matrix=False)
+    incremental = _stored_scores()
+    assert len(incremental) > 0
+
+    risk_engine.write_risk_scores(full=True, matrix=False)
+    assert_frame_equal(incremental, _stored_scores(), rtol=1e-9)
+
+def test_features_compute_only_needed_horizons(monkeypatch):
+    monkeypatch.setattr(risk_engine, "RISK_STORE_FEATURES", False)
+    prices, news = _prices(["AAA", "BBB"], 90), _news(["AAA", "BBB"], 100)
+    weights = {"vol_20d": 0.4, "vol_60d": 0.2, "sent_7d": -0.4}
+    cols = set(risk_engine._features(prices, news, weights).columns)
+    assert {"vol_20d", "vol_60d", "sent_7d"} <= cols
+    assert not {"vol_5d", "sent_3d", "sent_30d"} & cols
+
+    monkeypatch.setattr(risk_engine, "RISK_STORE_FEATURES", True)
+    assert set(risk_engine.FEATURES) <= set(risk_engine._features(prices, news).columns)
@@ -1,132 +1,151 @@
 import os, sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-import subprocess, time
+import time
 import streamlit as st
 import pandas as pd
-from sqlalchemy import create_engine, text, inspect
-from app.settings import DB_URL, STOCKS
-from app.db import Base
-from app.models import Price, News, RiskScore
+from app.settings import STOCKS
+from app.jobs import runner
+from ui.data import (
+    risk_series, load_stocks, load_panel, load_movers, data_version, invalidate,
+    downsample, downsample_panel, bin_panel,
+)
 """
 This is the Streamlist Frond-End. Allows for the following:
     User to pick a stock
     Pull the stocks risk scores, volatility, and sentiment
     Plot them in charts
+    Compare several stocks: score overlay and a stock x date heatmap
     Shows a "Top Risk Movers (last 7 days)" section for quick insights
 """
 
-# Connect to your DB once for read-only queries
-engine = create_engine(DB_URL, future=True)
-
-Base.metadata.create_all(bind=engine)
-
-insp = inspect(engine)
-must_have = ["prices", "news", "risk_scores"]
-if not all(insp.has_table(t) for t in must_have):
-    st.warning("Database initialized but tables are missing. Click **Refresh data** in the sidebar.")
-    st.stop()
-
+# Engine + schema are created once per server process (see ui/data.py);
+# queries below are cached on the current data version
 st.title("Financial Risk Dashboard — v0 (read-only)")
 
 # Add sidebar refresh button
 st.sidebar.header("Data Controls")
 
-if st.sidebar.button("Refresh data (prices, news, risk)"):
-    with st.spinner("Refreshing data..."):
-        cmds = [
-            [sys.executable, "-m", "app.etl_prices"],
-            [sys.executable, "-m", "app.etl_news"],
-            [sys.executable, "-m", "app.risk_engine"],
-        ]
-        ok = True
-        for cmd in cmds:
-            try:
-                subprocess.check_call(cmd)
-                time.sleep(5)  # pause to respect API limits
-            except subprocess.CalledProcessError:
-                ok = False
-                st.error(f"Failed running: {' '.join(cmd)}")
-                break
-        if ok:
-            st.success("Data refreshed. Try selecting a stock again!")
-
-
-# Choose which stock’s time series to view
-stock = st.selectbox("Select a stock", STOCKS)
-days = st.slider("Days to display", 30, 365, 120)
-
-# Plot the risk score line for 1 stock
+# The refresh runs in a background thread shared by every session (app/jobs.py),
+# so the page stays usable and a second click joins the run already in progress
+job = runner.current()
+running = job is not None and job.running
+force = st.sidebar.checkbox("Re-fetch tickers already refreshed today", value=False,
+                            disabled=running)
+if st.sidebar.button("Refresh data (prices, news, risk)", disabled=running):
+    job, started = runner.start(STOCKS, force=force)
+    running = True
+    if not started:
+        st.sidebar.info("A refresh is already running; showing its progress.")
+
+def _refresh_status():
+    snap = job.snapshot()
+    if snap["status"] == "running":
+        states = [v for t in snap["tickers"].values() for v in t.values()]
+        pending = sum(v in ("queued", "fetching", "loading") for v in states)
+        st.progress(1 - pending / max(len(states), 1),
+                    text=f"Refreshing {snap['step']} — {time.time() - snap['started']:.0f}s")
+        st.dataframe(pd.DataFrame.from_dict(snap["tickers"], orient="index"), height=240)
+        return
+    # Finished: drop this session's cached data once, then redraw the whole page
+    if st.session_state.get("refresh_seen") != snap["finished"]:
+        st.session_state["refresh_seen"] = snap["finished"]
+        invalidate()
+        st.rerun()
+    if snap["status"] == "done":
+        st.success(f"Data refreshed: +{snap['inserted']['prices']} price rows, "
+                   f"+{snap['inserted']['news']} news rows.")
+    else:
+        st.error(f"Refresh failed: {snap['error']}")
+    errors = {k: v for k, v in snap["tickers"].items()
+              if any(str(s).startswith("error") for s in v.values())}
+    if errors:
+        st.dataframe(pd.DataFrame.from_dict(errors, orient="index"))
+
+if job is not None:
+    with st.sidebar:
+        # Polls the job once a second while it runs; static once it's finished
+        st.fragment(_refresh_status, run_every=1.0 if running else None)()
+
+
+# Calendar windows for the comparison view
+PERIODS = {"3 months": 91, "6 months": 182, "1 year": 365, "2 years": 730, "5 years": 1826}
+
 try:
-    risk = pd.read_sql(
-        text("SELECT date, total_score, vol_20d, news_sent_7d "
-             "FROM risk_scores WHERE stock = :s ORDER BY date"),
-        engine, params={"s": stock}
-    )
+    version = data_version()
 except Exception:
     st.warning("No data found yet. Click **Refresh data** in the sidebar to populate the database.")
     st.stop()
 
-if risk.empty:
-    st.warning("No risk scores yet. Make sure ETLs and risk_engine ran.")
-else:
-    risk_tail = risk.tail(days).copy()
-    risk_tail["date"] = pd.to_datetime(risk_tail["date"])
-    st.line_chart(risk_tail.set_index("date")[["total_score"]], height=260)
-    st.caption("Total Risk Score (higher = riskier).")
+view = st.radio("View", ["Single stock", "Compare stocks"], horizontal=True)
 
-    c1, c2 = st.columns(2)
-    with c1:
-        st.line_chart(risk_tail.set_index("date")[["vol_20d"]], height=200)
-        st.caption("20-day Volatility")
-    with c2:
-        st.line_chart(risk_tail.set_index("date")[["news_sent_7d"]], height=200)
-        st.caption("7-day Avg News Sentiment (VADER)")
+if view == "Single stock":
+    # Choose which stock’s time series to view
+    stock = st.selectbox("Select a stock", STOCKS)
+    days = st.slider("Days to display", 30, 1260, 120)
 
-# Show Top Risk Movers (7d) to surface insight quickly
-st.subheader("Top Risk Movers (last 7 days)")
-with engine.connect() as c:
-    # Pull recent window for all stocks
-    df = pd.read_sql(
-        text("SELECT stock, date, total_score FROM risk_scores ORDER BY date"),
-        c
-    )
-if df.empty:
-    st.info("No risk data yet across stocks.")
-else:
-    df["date"] = pd.to_datetime(df["date"])
-    cutoff = df["date"].max() - pd.Timedelta(days=60)
-    df = df[df["date"] >= cutoff].copy()
-
-    # Compute 7d delta per stock (forward-filled daily index)
-    movers = []
-    for stck, g in df.groupby("stock"):
-        g = g.set_index("date").asfreq("D").ffill()
-        if len(g) < 8:  # need at least 7-day gap
-            continue
-        latest = g.index.max()
-        prev = latest - pd.Timedelta(days=7)
-        # if exact prev missing, nearest earlier day
-        if prev not in g.index:
-            prev = g.index[g.index.get_indexer([prev], method="nearest")][0]
-        delta = float(g.loc[latest, "total_score"] - g.loc[prev, "total_score"])
-        movers.append({"stock": stck, "latest": latest.date(),
-                       "now": float(g.loc[latest, "total_score"]),
-                       "prev": float(g.loc[prev, "total_score"]),
-                       "delta_7d": delta})
-    mv = pd.DataFrame(movers).sort_values("delta_7d", ascending=False)
-
-    if mv.empty:
-        st.info("Not enough recent data to compute movers.")
+    # Plot the risk score line for 1 stock (only the last `days` rows are read)
+    risk = risk_series(stock, version, days)
+    if risk.empty:
+        st.warning("No risk scores yet. Make sure ETLs and risk_engine ran.")
     else:
+        risk_tail = risk.copy()
+        risk_tail["date"] = pd.to_datetime(risk_tail["date"])
+        st.line_chart(downsample(risk_tail, "total_score").set_index("date"), height=260)
+        st.caption("Total Risk Score (higher = riskier).")
+
         c1, c2 = st.columns(2)
         with c1:
-            st.markdown("**Biggest Risers**")
-            st.dataframe(mv.head(5).reset_index(drop=True))
+            st.line_chart(downsample(risk_tail, "vol_20d").set_index("date"), height=200)
+            st.caption("20-day Volatility")
         with c2:
-            st.markdown("**Biggest Fallers**")
-            st.dataframe(mv.tail(5).sort_values("delta_7d").reset_index(drop=True))
+            st.line_chart(downsample(risk_tail, "news_sent_7d").set_index("date"), height=200)
+            st.caption("7-day Avg News Sentiment (VADER)")
+else:
+    import plotly.express as px   # only this view draws with plotly
+
+    scored = load_stocks(version)
+    picked = st.multiselect("Stocks", scored, default=[s for s in STOCKS if s in scored][:5])
+    period = st.selectbox("Period", list(PERIODS), index=2)
+    every = st.checkbox(f"Heatmap of all {len(scored)} scored stocks", value=False)
+
+    # Long ranges are downsampled server-side: LTTB per line for the overlay,
+    # date bins for the heatmap, both within DASHBOARD_MAX_POINTS
+    panel = load_panel(tuple(picked), version, PERIODS[period]) if picked else pd.DataFrame()
+    if panel.empty:
+        st.info("Pick one or more stocks with risk scores.")
+    else:
+        fig = px.line(downsample_panel(panel), x="date", y="total_score", color="stock", height=360)
+        st.plotly_chart(fig)
+        st.caption("Total Risk Score by stock.")
+
+    heat = load_panel(tuple(scored), version, PERIODS[period]) if every else panel
+    if not heat.empty:
+        grid = bin_panel(heat)
+        grid = grid[grid.iloc[-1].sort_values(ascending=False).index]   # riskiest first
+        fig = px.imshow(grid.T, aspect="auto", color_continuous_scale="RdYlGn_r",
+                        color_continuous_midpoint=0, labels={"color": "score"},
+                        height=max(300, min(18 * grid.shape[1], 1200)))
+        st.plotly_chart(fig)
+        st.caption("Risk score by stock x date" +
+                   (f" ({len(heat) // len(grid)}-day bins)." if len(grid) < len(heat) else "."))
+
+# Show Top Risk Movers (7d) to surface insight quickly
+st.subheader("Top Risk Movers (last 7 days)")
+mv = load_movers(version, n=5)
+if mv.empty:
+    st.info("Not enough recent data to compute movers.")
+else:
+    risers = mv[mv["side"] == "top"].drop(columns="side").reset_index(drop=True)
+    fallers = mv[mv["side"] == "bottom"].drop(columns="side").reset_index(drop=True)
+    c1, c2 = st.columns(2)
+    with c1:
+        st.markdown("**Biggest Risers**")
+        st.dataframe(risers)
+    with c2:
+        st.markdown("**Biggest Fallers**")
+        st.dataframe(fallers)
 
-        top5 = mv.head(5).set_index("stock")["delta_7d"]
-        if not top5.empty:
-            st.bar_chart(top5)
+    top5 = risers.set_index("stock")["delta_7d"]
+    if not top5.empty:
+        st.bar_chart(top5)
@@ -0,0 +1,197 @@
+import os
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+import streamlit as st
+from sqlalchemy import bindparam, text
+from app.settings import DB_URL, DASHBOARD_PROBE_SEC, DASHBOARD_MAX_POINTS, MATRIX_STORE, MATRIX_DIR
+from app.db import Base, make_engine
+from app import models  # noqa: F401  (registers tables on Base.metadata)
+from app.matrix_store import MatrixStore
+
+"""
+Cached data-access layer for the dashboard.
+The engine (and schema creation) is built once per server process. Query
+results are cached by a data version probed from risk_scores, so reruns
+that don't change data (slider moves, picking a stock) never hit the DB.
+Date windows are applied in SQL, and long series are downsampled here
+(see lttb) so the browser gets a bounded number of points per chart.
+"""
+
+@st.cache_resource
+def get_engine():
+    engine = make_engine(DB_URL)
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+# Cheap version probe: changes whenever risk_engine writes new scores
+# (new dates change MAX/COUNT, rescored dates advance the watermarks).
+# Memoized for a few seconds so widget reruns stay off the DB; the query
+# caches below are keyed on its value rather than expiring on a timer.
+@st.cache_data(ttl=DASHBOARD_PROBE_SEC, show_spinner=False)
+def data_version():
+    with get_engine().connect() as c:
+        row = c.execute(text(
+            "SELECT (SELECT MAX(date) FROM risk_scores), (SELECT COUNT(*) FROM risk_scores), "
+            "(SELECT MAX(last_price_id) FROM score_watermarks), "
+            "(SELECT MAX(last_news_id) FROM score_watermarks)"
+        )).one()
+    return tuple(str(v) for v in row)
+
+# Last `days` scored dates of one stock (all of them if days is None), oldest
+# first; a backward range scan of the covering (stock, date, ...) index
+@st.cache_data(max_entries=64, show_spinner=False)
+def load_risk(stock: str, version, days: int = None) -> pd.DataFrame:
+    limit = "" if days is None else " LIMIT :n"
+    df = pd.read_sql(
+        text("SELECT date, total_score, vol_20d, news_sent_7d "
+             "FROM risk_scores WHERE stock = :s ORDER BY date DESC" + limit),
+        get_engine(), params={"s": stock, "n": days}
+    )
+    return df.iloc[::-1].reset_index(drop=True)
+
+# Memory-mapped score matrices (MATRIX_STORE=1), reopened when meta.json changes
+@st.cache_resource(max_entries=1)
+def get_matrix_store(meta_mtime) -> MatrixStore:
+    return MatrixStore(MATRIX_DIR)
+
+# Last `days` of one stock's score series. From the matrix store the columns
+# are views into the memmaps (no SQL, no copy until the frame is filtered);
+# otherwise the cached SQL series.
+def risk_series(stock: str, version, days: int) -> pd.DataFrame:
+    meta = os.path.join(MATRIX_DIR, "meta.json")
+    if MATRIX_STORE and os.path.exists(meta):
+        store = get_matrix_store(os.path.getmtime(meta))
+        if stock in store.index:
+            df = pd.DataFrame({
+                "date": store.dates[-days:],
+                "total_score": store.series("total_score", stock, days),
+                "vol_20d": store.series("vol_20d", stock, days),
+                "news_sent_7d": store.series("news_sent_7d", stock, days),
+            }, copy=False)
+            return df[df["total_score"].notna()]
+    return load_risk(stock, version, days)
+
+# Every stock with scores, for the comparison view
+@st.cache_data(max_entries=4, show_spinner=False)
+def load_stocks(version) -> list:
+    with get_engine().connect() as c:
+        return list(c.execute(text("SELECT DISTINCT stock FROM risk_scores ORDER BY stock")).scalars())
+
+# total_score as a dates x stocks frame for the `days` calendar days up to the
+# latest score; from the matrix store when enabled, else one ranged SQL query
+@st.cache_data(max_entries=8, show_spinner=False)
+def load_panel(stocks: tuple, version, days: int) -> pd.DataFrame:
+    meta = os.path.join(MATRIX_DIR, "meta.json")
+    if MATRIX_STORE and os.path.exists(meta):
+        store = get_matrix_store(os.path.getmtime(meta))
+        cols = [s for s in stocks if s in store.index]
+        if cols and len(store.dates):
+            rows = store.date_slice(store.dates[-1] - np.timedelta64(days, "D"))
+            block = store.field("total_score")[rows][:, [store.index[s] for s in cols]]
+            wide = pd.DataFrame(np.asarray(block, dtype=float), columns=cols,
+                                index=pd.DatetimeIndex(store.dates[rows], name="date"))
+            return wide.dropna(how="all")
+    with get_engine().connect() as c:
+        latest = c.execute(text("SELECT MAX(date) FROM risk_scores")).scalar()
+        if latest is None:
+            return pd.DataFrame()
+        start = pd.Timestamp(latest).date() - timedelta(days=days)
+        q = text("SELECT stock, date, total_score FROM risk_scores "
+                 "WHERE date >= :start AND stock IN :stocks").bindparams(
+            bindparam("stocks", expanding=True))
+        df = pd.read_sql(q, c, params={"start": start, "stocks": list(stocks)})
+    df["date"] = pd.to_datetime(df["date"])
+    return df.pivot(index="date", columns="stock", values="total_score").sort_index()
+
+# --- server-side downsampling --------------------------------------------------
+
+def lttb(x, y, n: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: row indices of n points per column of y
+    (shape (len(x),) or (len(x), k), columns sharing the x axis) that keep the
+    visual shape of each line. Keeps the first and last point; from each
+    bucket in between, the point forming the largest triangle with the point
+    kept before it and the mean of the next bucket. Vectorized across columns,
+    so a panel of many stocks costs one pass over the buckets. NaNs are never
+    picked unless a bucket has nothing else. Returns shape (n, k) (or (n,)).
+    """
+    y = np.asarray(y, dtype=float)
+    flat = y.ndim == 1
+    y = y[:, None] if flat else y
+    x = np.asarray(x, dtype=float)
+    m, k = y.shape
+    if n >= m or n < 3:
+        idx = np.repeat(np.arange(m)[:, None], k, axis=1)
+        return idx[:, 0] if flat else idx
+    idx = np.empty((n, k), dtype=int)
+    idx[0], idx[-1] = 0, m - 1
+    edges = (np.arange(n - 1) * (m - 2) / (n - 2)).astype(int) + 1
+    cols = np.arange(k)
+    for i in range(n - 2):
+        a, b = edges[i], edges[i + 1]
+        c = edges[i + 2] if i + 2 < len(edges) else m
+        px, py = x[idx[i]], y[idx[i], cols]
+        nxt = y[b:c]
+        ok = ~np.isnan(nxt)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            nx, ny = x[b:c].mean(), np.where(ok, nxt, 0.0).sum(axis=0) / ok.sum(axis=0)
+            area = np.abs((px - nx) * (y[a:b] - py) - (px - x[a:b, None]) * (ny - py))
+        idx[i + 1] = a + np.where(np.isnan(area), -1.0, area).argmax(axis=0)
+    return idx[:, 0] if flat else idx
+
+# One series as (date, value) rows, LTTB-reduced to at most max_points
+def downsample(df: pd.DataFrame, col: str, max_points: int = DASHBOARD_MAX_POINTS) -> pd.DataFrame:
+    df = df[df[col].notna()]
+    if len(df) <= max_points:
+        return df[["date", col]]
+    x = pd.to_datetime(df["date"]).to_numpy().astype("datetime64[s]").astype(float)
+    return df[["date", col]].iloc[lttb(x, df[col].to_numpy(), max_points)]
+
+# Overlay lines for a dates x stocks panel, in long form; the point budget is
+# split across the stocks, each line reduced with LTTB on the shared date axis
+def downsample_panel(wide: pd.DataFrame, max_points: int = DASHBOARD_MAX_POINTS) -> pd.DataFrame:
+    if wide.empty:
+        return pd.DataFrame(columns=["date", "stock", "total_score"])
+    per_stock = max(max_points // wide.shape[1], 3)
+    x = wide.index.to_numpy().astype("datetime64[s]").astype(float)
+    idx = lttb(x, wide.to_numpy(), per_stock)
+    values = wide.to_numpy()[idx, np.arange(wide.shape[1])]
+    out = pd.DataFrame({
+        "date": wide.index.to_numpy()[idx].ravel(order="F"),
+        "stock": np.repeat(wide.columns.to_numpy(), idx.shape[0]),
+        "total_score": values.ravel(order="F"),
+    })
+    return out[out["total_score"].notna()].drop_duplicates(["stock", "date"])
+
+# Heatmap grid for a dates x stocks panel: consecutive dates are averaged
+# into bins so stocks x bins stays within the point budget
+def bin_panel(wide: pd.DataFrame, max_points: int = DASHBOARD_MAX_POINTS) -> pd.DataFrame:
+    if wide.empty:
+        return wide
+    n_bins = max(max_points // wide.shape[1], 1)
+    per_bin = -(-len(wide) // n_bins)
+    if per_bin <= 1:
+        return wide
+    groups = np.arange(len(wide)) // per_bin
+    binned = wide.groupby(groups).mean()
+    binned.index = wide.index[np.minimum((binned.index + 1) * per_bin, len(wide)) - 1]
+    return binned
+
+# Top Risk Movers: top and bottom n stocks by 7-day change, read from the
+# risk_movers table that risk_engine materializes after each scoring run
+@st.cache_data(max_entries=4, show_spinner=False)
+def load_movers(version, n: int = 5) -> pd.DataFrame:
+    cols = "stock, latest, now, prev, delta_1d, delta_7d, delta_30d"
+    return pd.read_sql(
+        text(f"SELECT 'top' AS side, * FROM (SELECT {cols} FROM risk_movers "
+             f"WHERE delta_7d IS NOT NULL ORDER BY delta_7d DESC LIMIT :n) AS t "
+             f"UNION ALL "
+             f"SELECT 'bottom' AS side, * FROM (SELECT {cols} FROM risk_movers "
+             f"WHERE delta_7d IS NOT NULL ORDER BY delta_7d ASC LIMIT :n) AS b"),
+        get_engine(), params={"n": n}
+    )
+
+# Drop cached versions/results after this session changed the data
+def invalidate():
+    data_version.clear()